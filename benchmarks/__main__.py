@@ -0,0 +1,62 @@
+"""Run the benchmark suite and write the results to a JSON file.
+
+uv run python -m benchmarks --sizes 1000 10000 --output bench.json
+uv run python -m benchmarks.compare old.json new.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from . import database_ops, ui
+from .deck import SIZES
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--skip-ui", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in args.sizes:
+            print(f"deck of {n} problems...", file=sys.stderr)
+            entry = {"database": database_ops.run(workdir, n, args.repeat)}
+            if not args.skip_ui:
+                entry["ui"] = ui.run(workdir, n, args.repeat)
+            report["results"][str(n)] = entry
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
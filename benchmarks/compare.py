@@ -0,0 +1,43 @@
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def rows(report):
+    for size, groups in report["results"].items():
+        for group, ops in groups.items():
+            for op, timing in ops.items():
+                yield (size, group, op), timing["median_ms"]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python -m benchmarks.compare BASE.json NEW.json")
+        return 2
+    base, new = (load(path) for path in argv)
+    base_rows = dict(rows(base))
+    print(
+        f"{'size':>7}  {'benchmark':<32} {'base ms':>10} {'new ms':>10} {'change':>8}"
+    )
+    for key, new_ms in rows(new):
+        size, group, op = key
+        base_ms = base_rows.get(key)
+        if base_ms is None:
+            change = "new"
+            base_text = "-"
+        else:
+            change = f"{(new_ms - base_ms) / base_ms:+.0%}" if base_ms else "-"
+            base_text = f"{base_ms:.2f}"
+        print(
+            f"{size:>7}  {group + '.' + op:<32} {base_text:>10} {new_ms:>10.2f} {change:>8}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
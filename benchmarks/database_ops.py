@@ -0,0 +1,80 @@
+import os
+import statistics
+import time
+
+from recall import database
+
+from .deck import write_deck
+
+
+def measure(fn, repeat=5):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return {
+        "min_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+    }
+
+
+def use_deck(workdir, n):
+    path = os.path.join(workdir, f"deck_{n}.json")
+    problems = write_deck(path, n)
+    database.DB_FILE = path
+    database._deck = database.DEFAULT_DECK
+    database._repository = None
+    return problems
+
+
+def run(workdir, n, repeat=5):
+    problems = use_deck(workdir, n)
+    repo = database.get_repository()
+    due_ids = [p["id"] for p in database.get_due_problems()][:repeat] or [1]
+    ids = [p["id"] for p in problems[:repeat]]
+    titles = [p["title"] for p in problems[-repeat:]]
+
+    def cold_load(_):
+        repo.invalidate()
+        repo.problems()
+
+    results = {
+        "load_db": measure(cold_load, repeat),
+        "get_due_problems": measure(lambda _: database.get_due_problems(), repeat),
+        "get_all_problems": measure(lambda _: database.get_all_problems(), repeat),
+        "get_all_problems_by_title": measure(
+            lambda i: database.get_all_problems("title", i % 2 == 1), repeat
+        ),
+        "sample_problems": measure(lambda _: database.sample_problems(5), repeat),
+        "sample_problems_weak": measure(
+            lambda _: database.sample_problems(5, weakness=True), repeat
+        ),
+        "get_stats": measure(lambda _: database.get_stats(), repeat),
+        "get_forecast": measure(lambda _: database.get_forecast(7), repeat),
+        "get_problem": measure(lambda i: database.get_problem(ids[i]), repeat),
+        "find_problem": measure(lambda i: database.find_problem(titles[i]), repeat),
+        "search_index_build": measure(
+            lambda _: setattr(repo, "_search_index", None)
+            or database.get_search_index(),
+            repeat,
+        ),
+        "search": measure(
+            lambda _: database.get_search_index().search("problem 42"), repeat
+        ),
+        "add_problem": measure(
+            lambda i: database.add_problem(f"Bench Add {i}", "Easy", "Stack"),
+            repeat,
+        ),
+        "mark_reviewed": measure(
+            lambda i: database.mark_reviewed(due_ids[i % len(due_ids)]), repeat
+        ),
+        "reset_problem": measure(lambda i: database.reset_problem(ids[i]), repeat),
+        "update_best_time": measure(
+            lambda i: database.update_best_time(ids[i], 60 - i), repeat
+        ),
+        "undo": measure(lambda _: database.undo(), repeat),
+        "redo": measure(lambda _: database.redo(), repeat),
+        "save_db": measure(lambda _: database.save_db(repo.problems()), repeat),
+    }
+    return results
@@ -0,0 +1,75 @@
+import json
+import random
+from datetime import date, timedelta
+
+from recall import constants
+from recall.database import DEFAULT_SCHEDULE, INTERVALS
+from recall.model import SCHEMA_VERSION
+
+SIZES = (1_000, 10_000, 100_000)
+
+# Rough shape of a real deck: more Mediums than anything else, a long tail
+# of mastered problems and most of the rest spread over the early stages.
+DIFFICULTY_WEIGHTS = {"Easy": 3, "Medium": 5, "Hard": 2}
+STAGE_WEIGHTS = [20, 25, 20, 15, 10, 10]
+MASTERED_RATE = 0.08
+URL_RATE = 0.7
+TIMED_RATE = 0.4
+
+
+def generate_deck(n, seed=0, today=None):
+    rng = random.Random(seed)
+    today = today or date.today()
+    topics = [value for _, value in constants.TOPIC_OPTIONS]
+    difficulties = list(DIFFICULTY_WEIGHTS)
+    difficulty_weights = list(DIFFICULTY_WEIGHTS.values())
+    stages = list(range(len(INTERVALS)))
+
+    problems = []
+    for i in range(n):
+        solved = today - timedelta(days=rng.randint(0, 365))
+        slug = f"synthetic-problem-{i}"
+        problem = {
+            "id": i + 1,
+            "title": f"Synthetic Problem {i}",
+            "difficulty": rng.choices(difficulties, difficulty_weights)[0],
+            "topic": rng.choice(topics),
+            "date_solved": solved.isoformat(),
+            "url": (
+                f"https://leetcode.com/problems/{slug}/"
+                if rng.random() < URL_RATE
+                else ""
+            ),
+            "best_time_seconds": (
+                rng.randint(120, 3600) if rng.random() < TIMED_RATE else None
+            ),
+            "schedule": DEFAULT_SCHEDULE,
+        }
+        if rng.random() < MASTERED_RATE:
+            problem.update(
+                review_stage=len(INTERVALS) - 1,
+                status="Mastered",
+                last_reviewed=(solved + timedelta(days=60)).isoformat(),
+                next_review="9999-12-31",
+            )
+        else:
+            stage = rng.choices(stages, STAGE_WEIGHTS)[0]
+            interval = INTERVALS[max(stage, 1)]
+            last = today - timedelta(days=rng.randint(0, interval * 2))
+            problem.update(
+                review_stage=stage,
+                status="Active",
+                last_reviewed=last.isoformat(),
+                next_review=(last + timedelta(days=interval)).isoformat(),
+            )
+        problems.append(problem)
+    return problems
+
+
+def write_deck(path, n, seed=0):
+    problems = generate_deck(n, seed)
+    with open(path, "w") as f:
+        json.dump(
+            {"version": SCHEMA_VERSION, "next_id": n + 1, "problems": problems}, f
+        )
+    return problems
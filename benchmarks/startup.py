@@ -0,0 +1,90 @@
+"""Startup time budget for the TUI.
+
+Each run starts a fresh interpreter against a synthetic deck and records
+how long it takes to import the app, paint the first frame and finish
+loading the database. The script exits non-zero when the median of any
+phase exceeds its budget, so it can gate CI:
+
+    uv run python -m benchmarks.startup --problems 10000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from .deck import write_deck
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import time
+start = time.perf_counter()
+import asyncio, json, sys
+sys.path.insert(0, {root!r})
+from recall.app import RecallApp
+imported = time.perf_counter()
+
+async def main():
+    app = RecallApp()
+    async with app.run_test(size=(120, 40)) as pilot:
+        first_frame = time.perf_counter()
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        loaded = time.perf_counter()
+        rows = app.query_one("#problem_table").row_count
+    print(json.dumps({{
+        "import_s": imported - start,
+        "first_frame_s": first_frame - start,
+        "loaded_s": loaded - start,
+        "rows": rows,
+    }}))
+
+asyncio.run(main())
+"""
+
+
+def run_once(workdir):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=ROOT)],
+        cwd=workdir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--problems", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-first-frame", type=float, default=1.5)
+    parser.add_argument("--budget-loaded", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_deck(os.path.join(workdir, "recall_db.json"), args.problems)
+        runs = [run_once(workdir) for _ in range(args.runs)]
+
+    result = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import_s", "first_frame_s", "loaded_s")
+    }
+    result["problems"] = args.problems
+    budgets = {
+        "first_frame_s": args.budget_first_frame,
+        "loaded_s": args.budget_loaded,
+    }
+    over = {k: v for k, v in budgets.items() if result[k] > v}
+    result["budgets"] = budgets
+    result["over_budget"] = sorted(over)
+    print(json.dumps(result, indent=2))
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
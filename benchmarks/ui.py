@@ -0,0 +1,92 @@
+import asyncio
+import statistics
+import time
+
+from .database_ops import use_deck
+
+SEARCH_QUERY = "problem 4"
+
+
+def _summary(samples):
+    return {
+        "min_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+    }
+
+
+async def _wait_for_search(app, pilot):
+    while app._search_timer is not None:
+        await pilot.pause(0.005)
+    await app.workers.wait_for_complete()
+    await pilot.pause()
+
+
+async def _run(repeat):
+    from recall import sampling
+    from recall.app import RecallApp
+
+    results = {}
+    app = RecallApp()
+    async with app.run_test(size=(160, 50)) as pilot:
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            app.refresh_data()
+            samples.append(time.perf_counter() - start)
+        results["refresh_data"] = _summary(samples)
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            app.action_toggle_view()
+            samples.append(time.perf_counter() - start)
+            await pilot.pause()
+        results["toggle_view"] = _summary(samples)
+
+        # search_apply is the work done per query (ranking plus the table
+        # update); search_end_to_end adds the debounce and worker hand-off
+        # seen after typing the query into the search box.
+        from recall import database
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            app.search_filter = SEARCH_QUERY
+            app._apply_search(
+                SEARCH_QUERY, database.get_search_index().search(SEARCH_QUERY)
+            )
+            samples.append(time.perf_counter() - start)
+            app.search_filter = ""
+            app._apply_search("", None)
+        results["search_apply"] = _summary(samples)
+
+        await pilot.press("ctrl+f")
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await pilot.press(*("space" if ch == " " else ch for ch in SEARCH_QUERY))
+            await _wait_for_search(app, pilot)
+            samples.append(time.perf_counter() - start)
+            await pilot.press(*["backspace"] * len(SEARCH_QUERY))
+            await _wait_for_search(app, pilot)
+        results["search_end_to_end"] = _summary(samples)
+        await pilot.press("ctrl+f")
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            app.start_test_mode(sampling.parse_spec("")[0])
+            await pilot.pause()
+            samples.append(time.perf_counter() - start)
+            app.pop_screen()
+            await pilot.pause()
+        results["enter_test_mode"] = _summary(samples)
+    return results
+
+
+def run(workdir, n, repeat=5):
+    use_deck(workdir, n)
+    return asyncio.run(_run(repeat))
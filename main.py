@@ -1,5 +1,6 @@
-from recall import RecallApp
+import sys
+
+from recall.cli import main
 
 if __name__ == "__main__":
-    app = RecallApp()
-    app.run()
+    sys.exit(main())
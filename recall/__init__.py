@@ -1,3 +1,10 @@
-from .app import RecallApp
-
 __all__ = ["RecallApp"]
+
+
+def __getattr__(name):
+    # Keep `import recall` free of Textual so the CLI starts fast.
+    if name == "RecallApp":
+        from .app import RecallApp
+
+        return RecallApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,22 +1,41 @@
+import time
+from datetime import datetime
+
+from textual import work
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.coordinate import Coordinate
+from textual.widgets import DataTable, Footer, Header, Input, Label, Static
+from textual.worker import get_current_worker
 
 from . import constants
 from . import database
-from .screens import (
-    AddModal,
-    DataTable,
-    Footer,
-    Header,
-    HelpModal,
-    Input,
-    Label,
-    SearchInput,
-    Static,
-    TestModeScreen,
-    TimerModal,
-)
+from . import facets
+from . import profiling
+from . import sampling
+from .widgets import ProblemTable, SearchInput
+
+COLUMN_KEYS = ("title", "diff", "topic", "progress", "best", "last")
+# Columns that sort when their header is clicked; "last" only in the due
+# view, where it shows the next review date.
+COLUMN_ORDERS = {
+    "title": "title",
+    "progress": "stage",
+    "best": "best_time",
+    "last": "next_review",
+}
+SORT_LABELS = {
+    "date_solved": "date solved",
+    "next_review": "next review",
+    "title": "title",
+    "stage": "stage",
+    "best_time": "best time",
+}
+SEARCH_DEBOUNCE_SECONDS = 0.15
+WATCH_INTERVAL_SECONDS = 1.0
+PAGE_SIZE = 100
+PAGE_MARGIN = 20
+WINDOW_ROWS = 3 * PAGE_SIZE
 
 
 class RecallApp(App):
@@ -28,25 +47,46 @@ class RecallApp(App):
         ("a", "add_problem", "Log Problem"),
         ("r", "review_problem", "Review (Done)"),
         ("x", "reset_problem", "Reset Progress"),
+        ("u", "undo", "Undo"),
+        ("U", "redo", "Redo"),
+        ("d", "switch_deck", "Decks"),
         ("l", "toggle_view", "Toggle Due/All"),
         ("o", "open_url", "Open URL"),
         ("enter", "open_url", "Open URL"),
         ("ctrl+f", "focus_search", "Focus Search"),
         ("s", "toggle_stats", "Toggle Stats"),
+        ("S", "cycle_sort", "Sort"),
     ]
 
     view_mode = "due"
     search_filter = ""
     show_stats = False
+    sort_order = None
+    sort_reverse = False
+
+    _table_layout = None
+    _rendered_rows = {}
+    _search_matches = None
+    _facet_filters = {}
+    _facet_errors = []
+    _search_timer = None
+    _view_problems = []
+    _window = (0, PAGE_SIZE)
+    _other_decks = []
+    _decks_stamp = None
 
     def __init__(self):
         super().__init__()
-        saved_theme = database.get_theme()
-        if saved_theme and saved_theme in self.available_themes:
-            self.theme = saved_theme
+        # The config is a few bytes; reading it here avoids repainting the
+        # first frame in the default theme.
+        self._saved_theme = database.get_theme()
+        if self._saved_theme and self._saved_theme in self.available_themes:
+            self.theme = self._saved_theme
 
     def watch_theme(self, old_theme: str, new_theme: str) -> None:
-        database.set_theme(new_theme)
+        if new_theme != self._saved_theme:
+            self._saved_theme = new_theme
+            database.set_theme(new_theme)
 
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
@@ -58,107 +98,438 @@ class RecallApp(App):
                     id="search_box",
                     classes="search-box",
                 )
-                yield DataTable(id="problem_table", cursor_type="row")
+                yield Static(id="facet_bar")
+                yield ProblemTable(id="problem_table", cursor_type="row")
 
             with Vertical(id="right-pane"):
                 yield Static("Stats", classes="section-title")
                 yield Static(id="stats_box", classes="stat-box")
+                yield Static(id="forecast_box", classes="stat-box")
+                yield Static(id="topic_box", classes="stat-box")
                 yield Static(id="view_indicator", classes="stat-box")
+        if profiling.enabled():
+            yield Static(id="profile_overlay")
         yield Footer()
 
     def on_mount(self) -> None:
-        self.refresh_data()
+        database.writer.on_error = self._report_write_error
+        if profiling.enabled():
+            self.set_interval(1, self._update_profile_overlay)
+        self.set_interval(WATCH_INTERVAL_SECONDS, self._check_external_changes)
+        self.sub_title = database.current_deck()
+        self.query_one("#list_title", Label).update("Loading problems...")
+        self._load_data()
+        self._check_decks()
         try:
             table = self.query_one("#problem_table", DataTable)
             table.focus()
+            self.watch(table, "scroll_y", lambda _: self._maybe_load_more())
         except Exception:
             pass
 
+    def on_unmount(self) -> None:
+        database.flush()
+
+    def _report_write_error(self, error: Exception) -> None:
+        message = f"Could not save changes: {error}"
+        try:
+            self.call_from_thread(self.notify, message, severity="error")
+        except RuntimeError:
+            self.notify(message, severity="error")
+
+    def _check_external_changes(self) -> None:
+        # Another terminal or a script may share the database; their changes
+        # are applied incrementally and shown without a restart.
+        if database.poll_changes():
+            self.refresh_data()
+            if self.search_filter:
+                self._start_search()
+        self._check_decks()
+
+    def _check_decks(self) -> None:
+        stamp = database.summaries_stamp()
+        if stamp != self._decks_stamp:
+            self._decks_stamp = stamp
+            self._load_deck_summaries()
+
+    @work(thread=True, exclusive=True, group="decks")
+    def _load_deck_summaries(self) -> None:
+        # Only the other decks: the active one is counted from the live
+        # stats on every refresh.
+        deck = database.current_deck()
+        rows = database.get_deck_summaries(include_active=False)
+        if not get_current_worker().is_cancelled:
+            self.call_from_thread(self._set_other_decks, deck, rows)
+
+    def _set_other_decks(self, deck, rows) -> None:
+        if deck == database.current_deck() and rows != self._other_decks:
+            self._other_decks = rows
+            self._update_stats()
+
+    def _update_profile_overlay(self) -> None:
+        self.query_one("#profile_overlay", Static).update(
+            "\n".join(profiling.summary_lines())
+        )
+
+    def push_screen(self, screen, *args, **kwargs):
+        if profiling.enabled():
+            # Measured up to the first refresh after the push, i.e. until
+            # the new screen has been composed and painted.
+            name = screen if isinstance(screen, str) else type(screen).__name__
+            name = f"screen.{name}"
+            start = time.perf_counter()
+            self.call_after_refresh(
+                lambda: profiling.record(name, start, time.perf_counter())
+            )
+        return super().push_screen(screen, *args, **kwargs)
+
+    @work(thread=True, exclusive=True, group="load")
+    def _load_data(self) -> None:
+        database.get_repository().problems()
+        self.call_from_thread(self.refresh_data)
+        # The search index is left to the first search, which runs in a
+        # worker too; most sessions never need it.
+        database.warm_sort_orders()
+
+    @profiling.timed("refresh_data")
     def refresh_data(self) -> None:
         table = self.query_one("#problem_table", DataTable)
         title_label = self.query_one("#list_title", Label)
         view_label = self.query_one("#view_indicator", Static)
 
-        table.clear(columns=True)
-
-        if self.view_mode == "due":
-            title_label.update("Due for Review")
-            view_label.update("Current View: [b]DUE[/b]")
-            table.add_columns(
-                "Title", "Diff", "Topic", "Progress", "Best", "Next Review"
+        order = self._current_order()
+        reverse = self.sort_reverse
+        layout = (self.view_mode, self.show_stats, order, reverse)
+        if layout != self._table_layout:
+            with profiling.span("refresh.columns"):
+                table.clear(columns=True)
+                last_label = "Next Review" if self.view_mode == "due" else "Status"
+                labels = ("Title", "Diff", "Topic", "Progress", "Best", last_label)
+                for label, key in zip(labels, COLUMN_KEYS):
+                    if self._column_order(key) == order:
+                        label += " ▼" if reverse else " ▲"
+                    table.add_column(label, key=key)
+            self._rendered_rows = {}
+            self._table_layout = layout
+            self._window = (0, PAGE_SIZE)
+
+        filters = self._facet_filters
+        sorted_by = ""
+        if self.sort_order is not None:
+            sorted_by = (
+                f"  [dim]by {SORT_LABELS[order]} {'▼' if reverse else '▲'}[/dim]"
             )
-            problems = database.get_due_problems()
-        else:
-            title_label.update("All Logged Problems")
-            view_label.update("Current View: [b]ALL[/b]")
-            table.add_columns("Title", "Diff", "Topic", "Progress", "Best", "Status")
-            problems = database.get_all_problems()
-
-        if not problems and self.view_mode == "due":
-            title_label.update("Due for Review [green](All Caught Up!)[/green]")
-
-        filtered_problems = [
-            p
-            for p in problems
-            if self.search_filter.lower() in p["title"].lower()
-            or self.search_filter.lower() in p.get("topic", "").lower()
-        ]
+        with profiling.span("refresh.query"):
+            if self.view_mode == "due":
+                title_label.update(f"Due for Review{sorted_by}")
+                view_label.update("Current View: [b]DUE[/b]")
+                if filters or order != "next_review" or reverse:
+                    problems = database.filter_problems(
+                        {"due_within": 0, **filters}, order, reverse
+                    )
+                else:
+                    problems = database.get_due_problems()
+            else:
+                title_label.update(f"All Logged Problems{sorted_by}")
+                view_label.update("Current View: [b]ALL[/b]")
+                if filters:
+                    problems = database.filter_problems(filters, order, reverse)
+                else:
+                    problems = database.get_all_problems(order, reverse)
 
-        def get_progress_bar(stage):
-            max_stages = len(database.INTERVALS) - 1
-            filled = "■" * stage
-            empty = "□" * (max_stages - stage)
-            return f"[{filled}{empty}]"
+        with profiling.span("refresh.facets"):
+            self._update_facets()
 
-        for p in filtered_problems:
-            topic = p.get("topic", p.get("topics", "Unknown"))
+        if not problems and self.view_mode == "due" and not filters:
+            title_label.update("Due for Review [green](All Caught Up!)[/green]")
 
-            if self.show_stats:
-                topic_display = constants.SHORT_TOPICS.get(topic, topic)
-                diff_display = constants.SHORT_DIFF.get(
-                    p["difficulty"], p["difficulty"][0] if p["difficulty"] else "?"
+        with profiling.span("refresh.filter"):
+            filtered_problems = problems
+            matches = self._search_matches
+            if matches is not None:
+                filtered_problems = sorted(
+                    (p for p in problems if p["id"] in matches),
+                    key=lambda p: -matches[p["id"]],
                 )
-            else:
-                topic_display = topic
-                diff_display = p["difficulty"]
 
-            progress = get_progress_bar(p.get("review_stage", 0))
-            last_col = p["next_review"] if self.view_mode == "due" else p["status"]
+        self._view_problems = filtered_problems
+        self._sync_view(table)
 
-            best_seconds = p.get("best_time_seconds")
-            if best_seconds is not None:
-                mins, secs = divmod(best_seconds, 60)
-                best_display = f"{mins:02d}:{secs:02d}"
-            else:
-                best_display = "--:--"
-
-            table.add_row(
-                p["title"],
-                diff_display,
-                topic_display,
-                progress,
-                best_display,
-                last_col,
-            )
+        with profiling.span("refresh.stats"):
+            self._update_stats()
 
+    def _update_stats(self) -> None:
         stats = database.get_stats()
         stat_text = (
             f"Total Solved: {stats['total']}\n"
             f"Due Today:    {stats['due']}\n"
             f"Mastered:     {stats['mastered']}"
         )
+        if self._other_decks:
+            due = stats["due"] + sum(deck["due"] for deck in self._other_decks)
+            count = len(self._other_decks) + 1
+            stat_text += f"\nAll Decks:    {due} due in {count} decks"
         self.query_one("#stats_box", Static).update(stat_text)
-        self.query_one("#stats_box", Static).update(stat_text)
+        self._update_forecast()
+        self._update_topics(stats)
+
+    def _current_order(self):
+        if self.sort_order is not None:
+            return self.sort_order
+        return "next_review" if self.view_mode == "due" else "date_solved"
+
+    def _column_order(self, key):
+        if key == "last" and self.view_mode != "due":
+            return None
+        return COLUMN_ORDERS.get(key)
+
+    def _set_sort(self, order, reverse=False) -> None:
+        self.sort_order = order
+        self.sort_reverse = reverse
+        self._window = (0, PAGE_SIZE)
+        self.refresh_data()
+
+    def on_data_table_header_selected(self, event: DataTable.HeaderSelected) -> None:
+        if event.data_table.id != "problem_table":
+            return
+        order = self._column_order(event.column_key.value)
+        if order is not None:
+            # Clicking the sorted column again flips its direction.
+            current = order == self._current_order()
+            self._set_sort(order, current and not self.sort_reverse)
+
+    def action_cycle_sort(self) -> None:
+        orders = list(database.SORT_KEYS)
+        current = orders.index(self._current_order())
+        self._set_sort(orders[(current + 1) % len(orders)])
+
+    def _update_facets(self) -> None:
+        filters = dict(self._facet_filters)
+        if self.view_mode == "due":
+            filters.setdefault("due_within", 0)
+        counts = database.get_facet_counts(filters)
+
+        def line(label, facet, names=None):
+            selected = self._facet_filters.get(facet)
+            parts = []
+            for value, count in sorted(counts[facet].items(), key=lambda kv: -kv[1]):
+                name = names.get(value, value) if names else value
+                text = f"{name} {count}"
+                if selected and value in selected:
+                    text = f"[b reverse]{text}[/]"
+                parts.append(text)
+            return f"[b]{label}[/b] " + " · ".join(parts)
+
+        stage = self._facet_filters.get("stage")
+        stages = " ".join(
+            (
+                f"[b reverse]{value}:{count}[/]"
+                if stage and stage[0] <= value <= stage[1]
+                else f"{value}:{count}"
+            )
+            for value, count in sorted(counts["stage"].items())
+        )
+        urls = counts["has_url"]
+        lines = [
+            line("Topic", "topic", constants.SHORT_TOPICS),
+            line("Diff", "difficulty", constants.SHORT_DIFF)
+            + "   "
+            + line("Status", "status"),
+            f"[b]Stage[/b] {stages}   "
+            f"[b]URL[/b] {urls.get(True, 0)} / none {urls.get(False, 0)}",
+        ]
+        if self._facet_errors:
+            lines.append(f"[red]{'; '.join(self._facet_errors)}[/red]")
+        self.query_one("#facet_bar", Static).update("\n".join(lines))
+
+    def _update_forecast(self) -> None:
+        forecast = database.get_forecast(constants.FORECAST_DAYS)
+        total = sum(count for _, count in forecast)
+        lines = [f"Next {constants.FORECAST_DAYS} days: {total}"]
+        for date, count in forecast:
+            day = datetime.strptime(date, database.DATE_FMT)
+            lines.append(f"{day:%a %d}  {'▮' * min(count, 15):<15} {count}")
+        self.query_one("#forecast_box", Static).update("\n".join(lines))
+
+    def _update_topics(self, stats) -> None:
+        lines = [f"{'Topic':<9} {'Done':>4} {'Mst':>4} {'Best':>6}"]
+        for topic, t in sorted(
+            stats["by_topic"].items(), key=lambda kv: -kv[1]["total"]
+        ):
+            best = "-"
+            if t["best_avg"] is not None:
+                mins, secs = divmod(t["best_avg"], 60)
+                best = f"{mins:02d}:{secs:02d}"
+            name = constants.SHORT_TOPICS.get(topic, topic)[:9]
+            lines.append(f"{name:<9} {t['total']:>4} {t['mastered']:>4} {best:>6}")
+        self.query_one("#topic_box", Static).update("\n".join(lines))
+
+    def _sync_view(self, table):
+        # Only a window of at most WINDOW_ROWS rows is formatted and handed
+        # to the table; _maybe_load_more slides it a page at a time as the
+        # user scrolls, so a long session does not grow the table.
+        start, end = self._window
+        total = len(self._view_problems)
+        if start and start >= total:
+            # The list shrank from under the window, e.g. reviews in the
+            # due view.
+            start = max(total - PAGE_SIZE, 0)
+            end = start + PAGE_SIZE
+            self._window = (start, end)
+        window = self._view_problems[start:end]
+        with profiling.span("refresh.format_rows"):
+            wanted = {str(p["id"]): self._format_row(p) for p in window}
+        with profiling.span("refresh.sync_rows"):
+            self._sync_rows(table, wanted)
+
+    def _maybe_load_more(self) -> None:
+        # Driven by the viewport alone: the table scrolls to follow the
+        # cursor, and a cursor left outside the window must not move it.
+        table = self.query_one("#problem_table", DataTable)
+        start, end = self._window
+        top = int(table.scroll_y)
+        bottom = top + table.scrollable_content_region.height
+        if end < len(self._view_problems) and bottom >= end - start - PAGE_MARGIN:
+            end += PAGE_SIZE
+            start = max(start, end - WINDOW_ROWS)
+        elif start and top < PAGE_MARGIN:
+            start = max(start - PAGE_SIZE, 0)
+            end = min(end, start + WINDOW_ROWS)
+        else:
+            return
+        self._move_window(table, start, end)
+
+    def _move_window(self, table, start, end) -> None:
+        # Table rows are counted from the window start: keep the viewport on
+        # the same problems as pages come and go above them. The table
+        # scrolls back to its cursor whenever rows change, so the cursor
+        # is kept inside the viewport.
+        shift = self._window[0] - start
+        y = table.scroll_y + shift
+        height = table.scrollable_content_region.height - table.header_height
+        cursor = min(max(table.cursor_row + shift, int(y)), int(y) + height - 1)
+        self._window = (start, end)
+        self._sync_view(table)
+        table.move_cursor(row=cursor, scroll=False)
+        table.scroll_to(y=y, animate=False, immediate=True)
+
+    def _jump_to(self, start, end, cursor) -> None:
+        table = self.query_one("#problem_table", DataTable)
+        self._window = (start, end)
+        self._sync_view(table)
+        table.move_cursor(row=cursor)
+
+    def action_table_top(self) -> None:
+        self._jump_to(0, PAGE_SIZE, 0)
+
+    def action_table_bottom(self) -> None:
+        end = len(self._view_problems)
+        start = max(end - WINDOW_ROWS, 0)
+        self._jump_to(start, end, end - start - 1)
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        if event.data_table.id == "problem_table":
+            self._maybe_load_more()
+
+    def _format_row(self, p):
+        topic = p["topic"]
+
+        if self.show_stats:
+            topic_display = constants.SHORT_TOPICS.get(topic, topic)
+            diff_display = constants.SHORT_DIFF.get(
+                p["difficulty"], p["difficulty"][0] if p["difficulty"] else "?"
+            )
+        else:
+            topic_display = topic
+            diff_display = p["difficulty"]
+
+        stage = p.get("review_stage", 0)
+        max_stages = len(database.intervals_for(p)) - 1
+        progress = f"[{'■' * stage}{'□' * max(max_stages - stage, 0)}]"
+        last_col = p["next_review"] if self.view_mode == "due" else p["status"]
+
+        best_seconds = p.get("best_time_seconds")
+        if best_seconds is not None:
+            mins, secs = divmod(best_seconds, 60)
+            best_display = f"{mins:02d}:{secs:02d}"
+        else:
+            best_display = "--:--"
+
+        return (
+            p["title"],
+            diff_display,
+            topic_display,
+            progress,
+            best_display,
+            last_col,
+        )
+
+    def _sync_rows(self, table, wanted):
+        for key in [key for key in self._rendered_rows if key not in wanted]:
+            table.remove_row(key)
+
+        for key, cells in wanted.items():
+            old_cells = self._rendered_rows.get(key)
+            if old_cells is None:
+                table.add_row(*cells, key=key)
+            elif old_cells != cells:
+                for column, old_value, value in zip(COLUMN_KEYS, old_cells, cells):
+                    if old_value != value:
+                        table.update_cell(key, column, value)
+        self._rendered_rows = wanted
+
+        # New rows are appended at the end; only re-order when the table no
+        # longer matches the order the data layer returned.
+        if [row.key.value for row in table.ordered_rows] != list(wanted):
+            position = {cells[0]: i for i, cells in enumerate(wanted.values())}
+            table.sort("title", key=position.__getitem__)
 
     def on_input_changed(self, event: Input.Changed) -> None:
         if event.input.id == "search_box":
-            self.search_filter = event.value
-            self.refresh_data()
+            # Facet tokens are answered from the indexes right away; only
+            # the free text goes through the debounced search worker.
+            filters, text, errors = facets.parse_query(event.value)
+            if (filters, errors) != (self._facet_filters, self._facet_errors):
+                self._facet_filters = filters
+                self._facet_errors = errors
+                self._window = (0, PAGE_SIZE)
+                self.refresh_data()
+            if text == self.search_filter:
+                return
+            self.search_filter = text
+            if self._search_timer is not None:
+                self._search_timer.stop()
+            self._search_timer = self.set_timer(
+                SEARCH_DEBOUNCE_SECONDS, self._start_search
+            )
+
+    def _start_search(self) -> None:
+        self._search_timer = None
+        self._run_search(self.search_filter)
+
+    @work(thread=True, exclusive=True, group="search")
+    @profiling.timed("search.query")
+    def _run_search(self, query: str) -> None:
+        worker = get_current_worker()
+        matches = database.get_search_index().search(query, lambda: worker.is_cancelled)
+        if not worker.is_cancelled:
+            self.call_from_thread(self._apply_search, query, matches)
+
+    def _apply_search(self, query, matches) -> None:
+        if query != self.search_filter:
+            return
+        self._search_matches = matches
+        self._window = (0, PAGE_SIZE)
+        self.refresh_data()
 
     def action_add_problem(self) -> None:
         def check_submit(submitted: bool):
             if submitted:
                 self.refresh_data()
+                if self.search_filter:
+                    self._start_search()
+
+        from .screens import AddModal
 
         self.push_screen(AddModal(), check_submit)
 
@@ -166,22 +537,23 @@ class RecallApp(App):
         self.view_mode = "all" if self.view_mode == "due" else "due"
         self.refresh_data()
 
-    def _get_selected_title(self):
+    def _get_selected_id(self):
         table = self.query_one("#problem_table", DataTable)
         if table.row_count == 0 or table.cursor_row is None:
             return None
         try:
-            return table.get_cell_at(Coordinate(table.cursor_row, 0))
+            row_key, _ = table.coordinate_to_cell_key(Coordinate(table.cursor_row, 0))
+            return int(row_key.value)
         except:
             return None
 
     def action_review_problem(self) -> None:
-        title = self._get_selected_title()
-        if not title:
+        problem_id = self._get_selected_id()
+        if problem_id is None:
             self.notify("Select a problem first!", severity="warning")
             return
 
-        success, msg = database.mark_reviewed(title)
+        success, msg = database.mark_reviewed(problem_id)
 
         if success:
             self.notify(msg)
@@ -190,29 +562,76 @@ class RecallApp(App):
             self.notify(msg, severity="error")
 
     def action_reset_problem(self) -> None:
-        title = self._get_selected_title()
-        if not title:
+        problem_id = self._get_selected_id()
+        if problem_id is None:
             self.notify("Select a problem first!", severity="warning")
             return
 
-        success, msg = database.reset_problem(title)
+        success, msg = database.reset_problem(problem_id)
         if success:
             self.notify(msg)
             self.refresh_data()
         else:
             self.notify(msg, severity="error")
 
+    def action_switch_deck(self) -> None:
+        from .screens import DeckModal
+
+        def switch(name):
+            if name is not None and name != database.current_deck():
+                self._switch_deck(name)
+
+        self.push_screen(DeckModal(database.get_deck_summaries()), switch)
+
+    def _switch_deck(self, name) -> None:
+        success, msg = database.use_deck(name)
+        if not success:
+            self.notify(msg, severity="error")
+            return
+        self.notify(msg)
+        self.sub_title = name
+        # Problem ids repeat across decks: start from an empty table.
+        self._table_layout = None
+        self._other_decks = []
+        self._decks_stamp = None
+        self._search_matches = None
+        self._facet_filters = {}
+        self._facet_errors = []
+        self.search_filter = ""
+        if self._search_timer is not None:
+            self._search_timer.stop()
+            self._search_timer = None
+        self.query_one("#search_box", Input).value = ""
+        self.query_one("#list_title", Label).update("Loading problems...")
+        self._load_data()
+        self._check_decks()
+
+    def action_undo(self) -> None:
+        self._step_history(database.undo)
+
+    def action_redo(self) -> None:
+        self._step_history(database.redo)
+
+    def _step_history(self, step) -> None:
+        success, msg = step()
+        if success:
+            self.notify(msg)
+            self.refresh_data()
+        else:
+            self.notify(msg, severity="warning")
+
     def action_open_url(self) -> None:
-        title = self._get_selected_title()
-        if not title:
+        problem_id = self._get_selected_id()
+        if problem_id is None:
             return
 
         import webbrowser
 
-        problems = database.get_all_problems()
-        problem = next((p for p in problems if p["title"] == title), None)
+        problem = database.get_problem(problem_id)
 
         if problem and problem.get("url"):
+            from .screens import TimerModal
+
             webbrowser.open(problem["url"])
 
             def handle_timer_result(result):
@@ -221,16 +640,26 @@ class RecallApp(App):
                     mins, secs = divmod(elapsed, 60)
                     time_str = f"{mins:02d}:{secs:02d}"
                     if is_new_best:
-                        self.notify(f"New best time: {time_str}!")
+                        message = f"New best time: {time_str}!"
                     else:
-                        self.notify(f"Time: {time_str} (not a new best)")
+                        message = f"Time: {time_str} (not a new best)"
+                    history = database.get_attempt_stats(problem_id)
+                    if history and history["attempts"] > 1:
+                        mins, secs = divmod(history["median"], 60)
+                        message += (
+                            f"\nMedian of {history['attempts']} attempts: "
+                            f"{mins:02d}:{secs:02d}"
+                        )
+                    self.notify(message)
                     self.refresh_data()
 
-            self.push_screen(TimerModal(title), handle_timer_result)
+            self.push_screen(TimerModal(problem), handle_timer_result)
         else:
             self.notify("No URL found for this problem.", severity="warning")
 
     def action_toggle_help(self) -> None:
+        from .screens import HelpModal
+
         self.push_screen(HelpModal())
 
     def action_focus_search(self) -> None:
@@ -254,8 +683,26 @@ class RecallApp(App):
         self.refresh_data()
 
     def action_enter_test_mode(self) -> None:
-        all_problems = database.get_all_problems()
-        if len(all_problems) < 3:
-            self.notify("Need at least 3 problems for Test Mode!", severity="error")
+        from .screens import TestSetupModal
+
+        def start(spec):
+            if spec is not None:
+                self.start_test_mode(spec)
+
+        self.push_screen(TestSetupModal(), start)
+
+    def start_test_mode(self, spec) -> None:
+        problems = database.sample_problems(
+            spec["size"], spec["topics"], spec["difficulties"], spec["weakness"]
+        )
+        if not problems:
+            self.notify("No problems match those filters!", severity="error")
             return
-        self.push_screen(TestModeScreen())
+        if len(problems) < spec["size"]:
+            self.notify(
+                f"Only {len(problems)} problems match; testing on all of them.",
+                severity="warning",
+            )
+        from .screens import TestModeScreen
+
+        self.push_screen(TestModeScreen(problems, sampling.describe(spec)))
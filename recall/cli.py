@@ -0,0 +1,242 @@
+import argparse
+import json
+import sys
+
+from . import database
+from . import profiling
+
+
+def _print_json(payload):
+    json.dump(payload, sys.stdout, indent=2, default=dict)
+    sys.stdout.write("\n")
+
+
+def cmd_due(args):
+    _print_json(database.get_due_problems())
+    return 0
+
+
+def cmd_review(args):
+    problem = database.find_problem(args.title)
+    if problem is None:
+        _print_json({"ok": False, "message": "Problem not found."})
+        return 1
+    success, msg = database.mark_reviewed(problem["id"])
+    _print_json({"ok": success, "message": msg, "problem": problem})
+    return 0 if success else 1
+
+
+def cmd_add(args):
+    from .transfer import validate_row
+
+    fields, error = validate_row(
+        {
+            "title": args.title,
+            "difficulty": args.difficulty,
+            "topic": args.topic,
+            "url": args.url,
+            "schedule": args.schedule,
+        }
+    )
+    if error:
+        _print_json({"ok": False, "message": error})
+        return 1
+    added = database.add_problem(
+        fields["title"],
+        fields["difficulty"],
+        fields["topic"],
+        fields["url"],
+        fields["schedule"],
+    )
+    if not added:
+        _print_json({"ok": False, "message": "Problem already exists."})
+        return 1
+    _print_json({"ok": True, "problem": database.find_problem(fields["title"])})
+    return 0
+
+
+def cmd_stats(args):
+    stats = database.get_stats()
+    stats["forecast"] = dict(database.get_forecast(args.days))
+    _print_json(stats)
+    return 0
+
+
+def cmd_reschedule(args):
+    if args.shift is not None:
+        changed = database.shift_reviews(args.shift)
+    elif args.cap is not None:
+        if args.cap < 1:
+            _print_json({"ok": False, "message": "--cap must be at least 1."})
+            return 1
+        changed = database.balance_reviews(args.cap)
+    else:
+        changed = database.replan_reviews()
+    _print_json({"ok": True, "changed": changed})
+    return 0
+
+
+def cmd_sample(args):
+    from .sampling import parse_spec
+
+    spec, error = parse_spec(" ".join(args.spec))
+    if error:
+        _print_json({"ok": False, "message": error})
+        return 1
+    _print_json(
+        database.sample_problems(
+            spec["size"], spec["topics"], spec["difficulties"], spec["weakness"]
+        )
+    )
+    return 0
+
+
+def cmd_history(args):
+    if args.title is None:
+        _print_json(database.get_topic_attempt_stats())
+        return 0
+    problem = database.find_problem(args.title)
+    if problem is None:
+        _print_json({"ok": False, "message": "Problem not found."})
+        return 1
+    _print_json(
+        {
+            "ok": True,
+            "problem": problem,
+            "summary": database.get_attempt_stats(problem["id"]),
+            "attempts": database.get_history().attempts(problem["id"]),
+        }
+    )
+    return 0
+
+
+def cmd_export(args):
+    from .transfer import export_file
+
+    try:
+        count = export_file(args.path, args.format)
+    except (ValueError, OSError) as e:
+        _print_json({"ok": False, "message": str(e)})
+        return 1
+    _print_json({"ok": True, "exported": count, "path": args.path})
+    return 0
+
+
+def cmd_import(args):
+    from .transfer import import_file
+
+    totals = {"added": 0, "duplicates": 0, "invalid": []}
+    try:
+        for batch in import_file(args.path, args.format):
+            totals["added"] += batch["added"]
+            totals["duplicates"] += batch["duplicates"]
+            totals["invalid"].extend(batch["invalid"])
+    except (ValueError, OSError) as e:
+        # Batches before the failure stay imported; say how many.
+        _print_json({"ok": False, "message": str(e), **totals})
+        return 1
+    _print_json({"ok": True, **totals})
+    return 0
+
+
+def cmd_decks(args):
+    decks = database.get_deck_summaries()
+    _print_json({"decks": decks, "due": sum(deck["due"] for deck in decks)})
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Spaced repetition for LeetCode problems. "
+        "Run without a command to open the TUI.",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="1",
+        metavar="OUT",
+        help="Record timing spans (also via RECALL_PROFILE). OUT ending in "
+        ".json writes a Chrome trace, .prof a cProfile dump, on exit.",
+    )
+    parser.add_argument(
+        "--deck", help="Use this deck (created if new) instead of the saved one"
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    due = sub.add_parser("due", help="List problems due for review")
+    due.set_defaults(func=cmd_due)
+
+    review = sub.add_parser("review", help="Mark a problem as reviewed")
+    review.add_argument("title")
+    review.set_defaults(func=cmd_review)
+
+    add = sub.add_parser("add", help="Log a new problem")
+    add.add_argument("title")
+    add.add_argument("-d", "--difficulty", required=True)
+    add.add_argument("-t", "--topic", required=True)
+    add.add_argument("-u", "--url", default="")
+    add.add_argument("-s", "--schedule", default=database.DEFAULT_SCHEDULE)
+    add.set_defaults(func=cmd_add)
+
+    stats = sub.add_parser("stats", help="Show totals and upcoming reviews")
+    stats.add_argument("--days", type=int, default=7)
+    stats.set_defaults(func=cmd_stats)
+
+    sample = sub.add_parser(
+        "sample", help='Draw a test set, e.g. "5 Medium DP/Graphs" or "10 weak"'
+    )
+    sample.add_argument("spec", nargs="*")
+    sample.set_defaults(func=cmd_sample)
+
+    reschedule = sub.add_parser(
+        "reschedule",
+        help="Re-plan next review dates for the whole deck "
+        "(default: recompute from each problem's schedule)",
+    )
+    mode = reschedule.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--shift", type=int, metavar="DAYS", help="Move every pending review"
+    )
+    mode.add_argument(
+        "--cap", type=int, metavar="N", help="Allow at most N reviews per day"
+    )
+    reschedule.set_defaults(func=cmd_reschedule)
+
+    history = sub.add_parser(
+        "history", help="Show solve-time history for a problem, or per topic"
+    )
+    history.add_argument("title", nargs="?")
+    history.set_defaults(func=cmd_history)
+
+    export = sub.add_parser("export", help="Export the deck to CSV or NDJSON")
+    export.add_argument("path")
+    export.add_argument("--format", choices=["csv", "ndjson"])
+    export.set_defaults(func=cmd_export)
+
+    import_ = sub.add_parser("import", help="Import problems from CSV or NDJSON")
+    import_.add_argument("path")
+    import_.add_argument("--format", choices=["csv", "ndjson"])
+    import_.set_defaults(func=cmd_import)
+
+    decks = sub.add_parser("decks", help="List decks and what is due in each")
+    decks.set_defaults(func=cmd_decks)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable(args.profile)
+    if args.deck:
+        ok, msg = database.use_deck(args.deck, remember=False)
+        if not ok:
+            _print_json({"ok": False, "message": msg})
+            return 1
+    if args.command is None:
+        from .app import RecallApp
+
+        RecallApp().run()
+        return 0
+    return args.func(args)
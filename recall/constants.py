@@ -32,4 +32,12 @@ SHORT_TOPICS = {
     "Dynamic Programming": "DP",
 }
 
+SCHEDULE_OPTIONS = [
+    ("Standard", "Standard"),
+    ("Tricky (more reviews early)", "Tricky"),
+    ("Easy (fewer reviews)", "Easy"),
+]
+
 SHORT_DIFF = {"Easy": "E", "Medium": "M", "Hard": "H"}
+
+FORECAST_DAYS = 7
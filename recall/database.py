@@ -1,149 +1,1321 @@
 import json
 import os
-import random
+import re
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+from . import profiling
+from . import sampling
+from . import scheduling
+from .history import AttemptHistory
+from .indexes import BucketIndex, DueIndex, FacetIndex, SortIndex, StatsIndex
+from .locking import FileLock
+from .model import (
+    SCHEMA_VERSION,
+    Problem,
+    load_records,
+    migrate,
+    to_ordinal,
+    to_text,
+)
+from .oplog import UNDO_LIMIT, OpLog
+from .writer import WriteBehind
+from .search import SearchIndex
+
 DB_FILE = "recall_db.json"
+# Further decks are sharded under DECKS_DIR, each with its own snapshot,
+# journal, history and summary named after the deck. DB_FILE stays the
+# default deck.
+DECKS_DIR = "recall_decks"
+DEFAULT_DECK = "default"
+DECK_NAME = re.compile(r"\w[\w .-]*")
 DATE_FMT = "%Y-%m-%d"
 
-INTERVALS = [0, 1, 3, 7, 21, 30]
+SCHEDULES = {
+    "Standard": [0, 1, 3, 7, 21, 30],
+    "Tricky": [0, 1, 2, 4, 7, 14, 21, 30],
+    "Easy": [0, 3, 7, 30],
+}
+DEFAULT_SCHEDULE = "Standard"
+INTERVALS = SCHEDULES[DEFAULT_SCHEDULE]
+
+writer = WriteBehind()
 
 
 def load_db():
-    if not os.path.exists(DB_FILE):
-        return []
-    with open(DB_FILE, "r") as f:
-        return json.load(f)
+    return list(get_repository().problems())
 
 
 def save_db(data):
-    with open(DB_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    get_repository().replace_all(data)
+    _changed()
+
+
+def _today():
+    return datetime.now().strftime(DATE_FMT)
+
+
+def _days_from_now(days):
+    return (datetime.now() + timedelta(days=days)).strftime(DATE_FMT)
+
+
+def parse_date(text):
+    return datetime.strptime(text, DATE_FMT)
+
+
+def _today_ordinal():
+    return to_ordinal(_today())
+
+
+def upcoming_dates(days):
+    return [_days_from_now(offset) for offset in range(1, days + 1)]
+
 
+def get_schedules():
+    # recall_config.json may redefine or add schedules under "schedules".
+    return {**SCHEDULES, **load_config().get("schedules", {})}
 
-def add_problem(title, difficulty, topic, url=""):
-    data = load_db()
 
-    if any(p["title"] == title for p in data):
-        return False
+def intervals_for(p):
+    schedules = get_schedules()
+    return schedules.get(p.get("schedule") or DEFAULT_SCHEDULE) or INTERVALS
 
-    new_entry = {
-        "id": len(data) + 1,
+
+def new_problem_fields(title, difficulty, topic, url="", schedule=DEFAULT_SCHEDULE):
+    today = _today()
+    intervals = intervals_for({"schedule": schedule})
+    return {
         "title": title,
         "difficulty": difficulty,
         "topic": topic,
-        "date_solved": datetime.now().strftime(DATE_FMT),
-        "last_reviewed": datetime.now().strftime(DATE_FMT),
+        "date_solved": today,
+        "last_reviewed": today,
         "review_stage": 0,
-        "next_review": (datetime.now() + timedelta(days=INTERVALS[1])).strftime(
-            DATE_FMT
-        ),
+        "next_review": _days_from_now(intervals[1]),
         "status": "Active",
         "url": url,
         "best_time_seconds": None,
+        "schedule": schedule,
     }
-    data.append(new_entry)
-    save_db(data)
-    return True
 
 
-def get_due_problems():
-    data = load_db()
-    today = datetime.now().strftime(DATE_FMT)
-    return [p for p in data if p["next_review"] <= today and p["status"] == "Active"]
+def daily_cap():
+    # Set "daily_cap" in recall_config.json to spread reviews so that no day
+    # gets more than that many; unset or 0 keeps exact intervals.
+    return load_config().get("daily_cap") or 0
 
 
-def get_all_problems():
-    data = load_db()
-    return sorted(data, key=lambda x: x["date_solved"], reverse=True)
+def undo_limit():
+    # How many operations `u` can step back through ("undo_limit" in
+    # recall_config.json).
+    return load_config().get("undo_limit") or UNDO_LIMIT
 
 
-def get_random_problems(n: int):
-    data = load_db()
-    if len(data) <= n:
-        return data
-    return random.sample(data, n)
+def review_changes(p, load=None):
+    # load(days) -> reviews already due that many days from now; passing it
+    # enables load smoothing under daily_cap().
+    today = _today()
+    if p["next_review"] > today:
+        return None, f"Not due yet! Next review: {p['next_review']}"
 
+    intervals = intervals_for(p)
+    current_stage = p["review_stage"]
+    if current_stage < len(intervals) - 1:
+        days_to_add = intervals[current_stage + 1]
+        cap = daily_cap()
+        if load is not None and cap:
+            days_to_add = scheduling.smooth(days_to_add, load, cap)
+        changes = {
+            "review_stage": current_stage + 1,
+            "last_reviewed": today,
+            "next_review": _days_from_now(days_to_add),
+        }
+        return changes, f"Reviewed! Next in {days_to_add} days."
+    return {"status": "Mastered", "next_review": "9999-12-31"}, "Problem Mastered!"
 
-def get_stats():
-    data = load_db()
-    total = len(data)
-    due = len(get_due_problems())
-    mastered = len([p for p in data if p["status"] == "Mastered"])
-    return {"total": total, "due": due, "mastered": mastered}
-
-
-def mark_reviewed(problem_title):
-    data = load_db()
-    today = datetime.now().strftime(DATE_FMT)
-
-    for p in data:
-        if p["title"] == problem_title:
-            if p["next_review"] > today:
-                return False, f"Not due yet! Next review: {p['next_review']}"
-
-            current_stage = p["review_stage"]
-            if current_stage < len(INTERVALS) - 1:
-                p["review_stage"] += 1
-                days_to_add = INTERVALS[p["review_stage"]]
-                p["last_reviewed"] = today
-                p["next_review"] = (
-                    datetime.now() + timedelta(days=days_to_add)
-                ).strftime(DATE_FMT)
-                save_db(data)
-                return True, f"Reviewed! Next in {days_to_add} days."
-            else:
-                p["status"] = "Mastered"
-                p["next_review"] = "9999-12-31"
-                save_db(data)
-                return True, "Problem Mastered!"
 
-    return False, "Problem not found."
+# Sort orders offered by the problem table. Each key ends in the id so that
+# ties break the same way everywhere; timed problems sort before untimed.
+SORT_KEYS = {
+    "date_solved": lambda p: (-p.solved_on, p.id),
+    "next_review": lambda p: (p.due_on, p.id),
+    "title": lambda p: (p.title.casefold(), p.id),
+    "stage": lambda p: (p.review_stage, p.id),
+    "best_time": lambda p: (
+        p.best_time_seconds is None,
+        p.best_time_seconds or 0,
+        p.id,
+    ),
+}
+# A filter matching fewer than 1/SORT_SCAN_RATIO of the deck is sorted
+# directly; larger ones are picked out of the maintained order.
+SORT_SCAN_RATIO = 16
+
+
+def sort_problems(problems, order="date_solved", reverse=False):
+    return sorted(problems, key=SORT_KEYS[order], reverse=reverse)
+
+
+def weakness_weight(p, today, median_best):
+    # Higher for problems early in their schedule, not reviewed for a
+    # while, or solved slower than the deck's median best time.
+    max_stage = len(intervals_for(p)) - 1
+    stage = min(p.review_stage, max_stage)
+    weight = 2 - stage / max_stage if max_stage else 1
+    age = today - p.reviewed_on
+    weight *= 1 + min(max(age, 0), 60) / 30
+    best = p.best_time_seconds
+    if best and median_best:
+        weight *= min(max(best / median_best, 0.5), 3)
+    return weight
+
+
+def sample_from(buckets, get, n, topics=None, difficulties=None, weakness=False):
+    if not weakness:
+        return [get(pid) for pid in buckets.sample(n, topics, difficulties)]
+    pool = [
+        get(pid)
+        for pid in buckets.sample(n * sampling.POOL_FACTOR, topics, difficulties)
+    ]
+    times = sorted(p.best_time_seconds for p in pool if p.best_time_seconds)
+    median_best = times[len(times) // 2] if times else None
+    today = _today_ordinal()
+    return sampling.weighted_pick(
+        pool, n, lambda p: weakness_weight(p, today, median_best)
+    )
+
+
+def reset_changes(p):
+    return {
+        "review_stage": 0,
+        "status": "Active",
+        "last_reviewed": _today(),
+        "next_review": _days_from_now(intervals_for(p)[1]),
+    }
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def read_snapshot(path):
+    # -> (records, header); the header holds every top-level field but
+    # "problems". See model.SCHEMA_VERSION for "version".
+    with open(path, "r") as f:
+        snapshot = json.load(f)
+    if isinstance(snapshot, list):
+        return snapshot, {"version": 0}
+    records = snapshot.pop("problems")
+    snapshot.setdefault("version", 1)
+    return records, snapshot
+
+
+def read_header(path, size=4096):
+    # The header of a snapshot written by dump_snapshot, without parsing the
+    # records: those fields come first. None for anything else.
+    with open(path, "r") as f:
+        head = f.read(size)
+    end = head.find('\n  "problems": [')
+    if end < 0:
+        return None
+    try:
+        return json.loads(head[:end].rstrip(",") + "\n}")
+    except ValueError:
+        return None
+
+
+def dump_snapshot(f, records, next_id, generation=0, base=None):
+    # "generation" counts snapshot rewrites. A compaction also records its
+    # "base": the generation and journal offset it folded in, so readers
+    # already past that offset can carry on from the shortened journal.
+    header = {"version": SCHEMA_VERSION, "generation": generation, "next_id": next_id}
+    if base is not None:
+        header["base"] = base
+    json.dump({**header, "problems": records}, f, indent=2)
+
+
+def write_snapshot(path, data, next_id, generation=0, base=None):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        dump_snapshot(f, [p.to_dict() for p in data], next_id, generation, base)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_journal(path, offset=0):
+    # -> (entries, offset just past the last complete line). A torn final
+    # line is left for the next writer to cut off.
+    entries = []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return entries, offset
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            offset += len(line)
+    return entries, offset
+
+
+def apply_journal(data, entries):
+    # -> (data, next_id). The journal may add and then remove a problem;
+    # its id must still not be handed out again, so next_id covers every
+    # id the journal ever added.
+    by_id = {p.get("id"): p for p in data}
+    titles = {p["title"] for p in data}
+    next_id = 1
+    for entry in entries:
+        if entry["op"] == "add":
+            record = entry["record"]
+            next_id = max(next_id, record["id"] + 1)
+            if record["id"] not in by_id and record["title"] not in titles:
+                data.append(record)
+                by_id[record["id"]] = record
+                titles.add(record["title"])
+        elif entry["op"] == "replan":
+            for pid, next_review in entry["dates"].items():
+                if int(pid) in by_id:
+                    by_id[int(pid)]["next_review"] = next_review
+        elif entry["op"] == "remove":
+            record = by_id.pop(entry["id"], None)
+            if record is not None:
+                data.remove(record)
+                titles.discard(record["title"])
+        elif entry["id"] in by_id:
+            by_id[entry["id"]].update(entry["set"])
+    return data, next_id
+
+
+def replay_journal(data, journal_path):
+    entries, offset = read_journal(journal_path)
+    if os.path.exists(journal_path) and offset != os.path.getsize(journal_path):
+        # Drop a torn final line left by a crash mid-append so the next
+        # entry starts on a clean line.
+        with open(journal_path, "r+b") as f:
+            f.truncate(offset)
+    return apply_journal(data, entries)
+
+
+class ProblemRepository:
+    COMPACT_THRESHOLD = 256 * 1024
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        stem = os.path.splitext(path)[0]
+        self.journal_path = stem + ".journal"
+        self._data = []
+        self._by_id = {}
+        self._by_title = {}
+        self._due_index = DueIndex()
+        self._stats_index = StatsIndex()
+        self._buckets = BucketIndex()
+        self._facets = FacetIndex()
+        self._orders = SortIndex(SORT_KEYS)
+        self._next_id = 1
+        self._search_index = None
+        # Ids changed while the search index is built outside the lock.
+        self._search_touched = None
+        self._stamp = None
+        # How far this instance has caught up with the files: the snapshot
+        # generation it started from and the journal bytes applied on top.
+        self._generation = 0
+        self._journal_offset = 0
+        # Held, across processes too, whenever the files or the in-memory
+        # state change.
+        self._lock = FileLock(stem + ".lock")
+        self._pending_lines = []
+        self._compactor = None
+        self.oplog = OpLog(undo_limit())
+
+    def _file_stamp(self):
+        return (_file_stamp(self.path), _file_stamp(self.journal_path))
+
+    def _reindex(self, next_id=None):
+        self._by_id = {}
+        self._by_title = {}
+        self._search_index = None
+        self._search_touched = None
+        self._next_id = max(
+            [next_id or 1] + [p.id + 1 for p in self._data if isinstance(p.id, int)]
+        )
+        repaired = False
+        for p in self._data:
+            if p.id in self._by_id or not isinstance(p.id, int):
+                p.id = self._next_id
+                self._next_id += 1
+                repaired = True
+            self._by_id[p.id] = p
+            self._by_title[p.title] = p
+        self._due_index = DueIndex(self._data)
+        self._stats_index = StatsIndex(self._data)
+        self._buckets = BucketIndex(self._data)
+        self._facets = FacetIndex(self._data)
+        self._orders = SortIndex(SORT_KEYS, self._data)
+        return repaired
+
+    def _track(self, record):
+        self._by_id[record.id] = record
+        self._by_title[record.title] = record
+        self._due_index.update(record)
+        self._stats_index.update(record)
+        self._buckets.update(record)
+        self._facets.update(record)
+        self._orders.update(record)
+        if self._search_index is not None:
+            self._search_index.add(record)
+        elif self._search_touched is not None:
+            self._search_touched.add(record.id)
+
+    def _add_record(self, record):
+        self._data.append(record)
+        self._next_id = max(self._next_id, record.id + 1)
+        self._track(record)
 
+    def _remove_record(self, p):
+        # Undoing an add almost always removes the newest record.
+        if self._data and self._data[-1] is p:
+            self._data.pop()
+        else:
+            self._data.remove(p)
+        del self._by_id[p.id]
+        del self._by_title[p.title]
+        self._due_index.discard(p.id)
+        self._stats_index.discard(p.id)
+        self._buckets.discard(p.id)
+        self._facets.discard(p.id)
+        self._orders.discard(p)
+        if self._search_index is not None:
+            self._search_index.remove(p.id)
+        elif self._search_touched is not None:
+            self._search_touched.add(p.id)
 
-def reset_problem(problem_title):
-    data = load_db()
-    today = datetime.now().strftime(DATE_FMT)
+    def _apply_changes(self, p, changes):
+        renamed = "title" in changes and changes["title"] != p.title
+        self._orders.discard(p)
+        if renamed:
+            del self._by_title[p.title]
+        p.update(changes)
+        self._due_index.update(p)
+        self._stats_index.update(p)
+        self._buckets.update(p)
+        self._facets.update(p)
+        self._orders.update(p)
+        if renamed:
+            self._by_title[p.title] = p
+        if changes.keys() & {"title", "topic"}:
+            if self._search_index is not None:
+                self._search_index.remove(p.id)
+                self._search_index.add(p)
+            elif self._search_touched is not None:
+                self._search_touched.add(p.id)
 
-    for p in data:
-        if p["title"] == problem_title:
-            p["review_stage"] = 0
-            p["status"] = "Active"
-            p["last_reviewed"] = today
-            p["next_review"] = (datetime.now() + timedelta(days=INTERVALS[1])).strftime(
-                DATE_FMT
+    def _set_next_reviews(self, next_reviews):
+        for pid, next_review in next_reviews.items():
+            p = self._by_id.get(pid)
+            if p is not None:
+                p["next_review"] = next_review
+        self._due_index = DueIndex(self._data)
+        self._orders.forget("next_review")
+
+    def problems(self):
+        if self._file_stamp() != self._stamp:
+            with self._lock:
+                self._sync()
+        return self._data
+
+    def poll_changes(self):
+        # Applies what other processes wrote since the last look and says
+        # whether anything changed. Does nothing before the first load.
+        if self._stamp is None or self._file_stamp() == self._stamp:
+            return False
+        with self._lock:
+            return self._sync()
+
+    def _sync(self):
+        # Catch up with the files; the caller holds the lock. Usually that
+        # means applying the journal lines appended by other processes.
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        if self._stamp is None:
+            self._load(stamp)
+            return True
+        snapshot, journal = stamp
+        if snapshot != self._stamp[0]:
+            header = read_header(self.path) if snapshot is not None else None
+            generation = header.get("generation") if header else None
+            if generation != self._generation:
+                base = header.get("base") if header else None
+                if not base or base[0] != self._generation:
+                    return self._reload(stamp)
+                if base[1] > self._journal_offset:
+                    return self._reload(stamp)
+                # Compacted by another process up to an offset already
+                # applied here: follow on in the shortened journal.
+                self._generation = generation
+                self._journal_offset -= base[1]
+        if (journal[1] if journal else 0) < self._journal_offset:
+            return self._reload(stamp)
+        entries, self._journal_offset = read_journal(
+            self.journal_path, self._journal_offset
+        )
+        for entry in entries:
+            self._apply_entry(entry)
+        self._stamp = stamp
+        return bool(entries)
+
+    def _apply_entry(self, entry):
+        if entry["op"] == "add":
+            record = entry["record"]
+            self._next_id = max(self._next_id, record["id"] + 1)
+            if (
+                record["id"] not in self._by_id
+                and record["title"] not in self._by_title
+            ):
+                self._add_record(Problem.from_dict(record))
+        elif entry["op"] == "replan":
+            self._set_next_reviews(
+                {int(pid): next_review for pid, next_review in entry["dates"].items()}
             )
-            save_db(data)
-            return True, f"Reset {problem_title} to zero."
+        elif entry["op"] == "remove":
+            p = self._by_id.get(entry["id"])
+            if p is not None:
+                self._remove_record(p)
+        elif entry["id"] in self._by_id:
+            self._apply_changes(self._by_id[entry["id"]], entry["set"])
+
+    def _read_files(self, stamp):
+        data, header = [], {"version": SCHEMA_VERSION}
+        with profiling.span("db.read_snapshot"):
+            if stamp[0] is not None:
+                data, header = read_snapshot(self.path)
+        with profiling.span("db.replay_journal"):
+            entries, self._journal_offset = read_journal(self.journal_path)
+            _, next_id = apply_journal(data, entries)
+        header["next_id"] = max(header.get("next_id") or 1, next_id)
+        self._generation = header.get("generation", 0)
+        return data, header
+
+    def _load(self, stamp):
+        data, header = self._read_files(stamp)
+        with profiling.span("db.load_records"):
+            self._data = load_records(data, header["version"])
+        with profiling.span("db.reindex"):
+            repaired = self._reindex(header.get("next_id"))
+        # Only now: problems() skips the lock once the stamp matches, and
+        # other threads must not see the indexes half built.
+        self._stamp = stamp
+        if repaired or header["version"] < SCHEMA_VERSION:
+            # Hand-edited records without a usable id were just given
+            # one, or an older snapshot was migrated; persist it so
+            # journal entries can refer to the records as they are now.
+            self.commit()
+
+    def _reload(self, stamp):
+        # The snapshot was rewritten in a way the journal cannot explain
+        # (an import, a migration, a compaction of lines not seen yet).
+        # Re-read both files, but only touch the records that differ.
+        data, header = self._read_files(stamp)
+        records = migrate(data, header["version"])
+        fresh = {r.get("id"): r for r in records}
+        if None in fresh or len(fresh) < len(records):
+            # Records lost their ids: nothing to diff against.
+            self._data = load_records(records)
+            self._reindex(header.get("next_id"))
+            self._stamp = stamp
+            return True
+        changed = False
+        for pid in self._by_id.keys() - fresh:
+            self._remove_record(self._by_id[pid])
+            changed = True
+        for record in records:
+            p = self._by_id.get(record["id"])
+            if p is None:
+                self._add_record(Problem.from_dict(record))
+                changed = True
+                continue
+            changes = {k: v for k, v in record.items() if k in p and p[k] != v}
+            if changes:
+                self._apply_changes(p, changes)
+                changed = True
+        self._next_id = max(self._next_id, header.get("next_id") or 1)
+        self._stamp = stamp
+        return changed
+
+    @contextmanager
+    def _transaction(self):
+        # Changes are made against the latest state of the files and
+        # reach the journal before the lock is released, so processes
+        # sharing the database apply each other's changes in order and
+        # never hand out the same id. Only the fsync is left to the writer.
+        with self._lock:
+            self._sync()
+            try:
+                yield
+            finally:
+                try:
+                    wrote = self._write_pending()
+                except OSError:
+                    wrote = True  # kept in _pending_lines; flush_journal retries
+                if wrote:
+                    writer.submit(("journal", self.journal_path), self.flush_journal)
+
+    def _log(self, op, **fields):
+        self._log_many([{"op": op, **fields}])
+
+    def _log_many(self, entries):
+        self._pending_lines.append(
+            "".join(
+                json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries
+            )
+        )
+
+    def _write_pending(self):
+        # The caller holds the lock and is caught up, so the journal ends
+        # where this instance stopped reading it; anything after that is a
+        # torn line from a crashed writer.
+        lines = "".join(self._pending_lines).encode()
+        if not lines:
+            return False
+        with open(self.journal_path, "ab") as f:
+            if f.tell() != self._journal_offset:
+                f.truncate(self._journal_offset)
+            f.write(lines)
+        self._pending_lines = []
+        self._journal_offset += len(lines)
+        self._stamp = self._file_stamp()
+        return True
+
+    @profiling.timed("db.journal_append")
+    def flush_journal(self):
+        with self._lock:
+            if self._pending_lines:
+                self._sync()
+                self._write_pending()
+            try:
+                fd = os.open(self.journal_path, os.O_RDONLY)
+            except FileNotFoundError:
+                return
+            journal_size = self._journal_offset
+        # Outside the lock, so transactions on the UI thread never wait on
+        # the disk. If a compaction swaps the journal meanwhile, it syncs the
+        # lines it carries over itself.
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if journal_size > self.COMPACT_THRESHOLD:
+            self.compact_in_background()
 
-    return False, "Problem not found."
+    def replace_all(self, data):
+        with self._lock:
+            self._sync()
+            self._data = load_records([dict(p) for p in data], 0)
+            self._reindex()
+            self.commit()
+
+    @profiling.timed("db.write_snapshot")
+    def commit(self):
+        # A full rewrite from memory, for changes that never went through
+        # the journal; the caller holds the lock and is caught up. Other
+        # processes pick it up by diffing.
+        with self._lock:
+            # The snapshot already holds every change still waiting in
+            # _pending_lines, so they no longer need to reach the journal.
+            self._pending_lines = []
+            self._generation += 1
+            write_snapshot(self.path, self._data, self._next_id, self._generation)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_offset = 0
+            self._stamp = self._file_stamp()
+
+    @profiling.timed("db.compact")
+    def compact(self):
+        with self._lock:
+            if self._pending_lines:
+                return
+            # Memory is exactly the snapshot plus the journal up to here.
+            data = [p.to_dict() for p in self._data]
+            next_id = self._next_id
+            generation = self._generation
+            offset = self._journal_offset
+            snapshot = self._stamp[0]
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            dump_snapshot(f, data, next_id, generation + 1, [generation, offset])
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            if self._generation != generation or _file_stamp(self.path) != snapshot:
+                # Another process rewrote the snapshot meanwhile.
+                os.remove(tmp_path)
+                return
+            # Entries appended while the snapshot was being written, here or
+            # elsewhere, stay in the journal. Replay is idempotent, so a
+            # crash between these two steps only re-applies changes already
+            # in the snapshot.
+            os.replace(tmp_path, self.path)
+            tail = b""
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    f.seek(offset)
+                    tail = f.read()
+            if tail:
+                journal_tmp = f"{self.journal_path}.tmp"
+                with open(journal_tmp, "wb") as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(journal_tmp, self.journal_path)
+            elif os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._generation = generation + 1
+            self._journal_offset -= offset
+            # The carried tail may hold lines not applied here yet; leave the
+            # journal unstamped so the next sync reads them.
+            self._stamp = (_file_stamp(self.path), None)
+
+    def compact_in_background(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+
+    def invalidate(self):
+        self._stamp = None
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        self._lock.close()
+
+    def get_problem(self, problem_id):
+        self.problems()
+        return self._by_id.get(problem_id)
+
+    def find_problem(self, title):
+        self.problems()
+        return self._by_title.get(title)
+
+    def iter_problems(self):
+        return iter(self.problems())
+
+    def search_index(self):
+        self.problems()
+        # Usually built by a worker thread, and slow on a big deck: it is
+        # built outside the lock so the UI thread's changes do not wait on
+        # it. Problems touched meanwhile are re-added when it is installed;
+        # a full reindex meanwhile means starting over.
+        while True:
+            with self._lock:
+                if self._search_index is not None:
+                    return self._search_index
+                problems = list(self._data)
+                touched = self._search_touched = set()
+            index = SearchIndex(problems)
+            with self._lock:
+                if self._search_touched is not touched:
+                    continue
+                self._search_touched = None
+                for problem_id in touched:
+                    index.remove(problem_id)
+                    if problem_id in self._by_id:
+                        index.add(self._by_id[problem_id])
+                self._search_index = index
+                return index
+
+    def add_problem(self, title, difficulty, topic, url="", schedule=DEFAULT_SCHEDULE):
+        with self._transaction():
+            if title in self._by_title:
+                return False
+            record = Problem.from_dict(
+                {
+                    "id": self._next_id,
+                    **new_problem_fields(title, difficulty, topic, url, schedule),
+                }
+            )
+            self._add_record(record)
+            self._log("add", record=record.to_dict())
+            self.oplog.record("add", record.id, title, None, record.to_dict())
+        return True
 
+    def add_problems(self, records):
+        added = []
+        with self._transaction():
+            for fields in records:
+                if fields["title"] in self._by_title:
+                    continue
+                record = Problem.from_dict({"id": self._next_id, **fields})
+                self._add_record(record)
+                added.append(record)
+            if added:
+                self._log_many(
+                    [{"op": "add", "record": record.to_dict()} for record in added]
+                )
+        return added
 
-def update_best_time(problem_title, seconds):
-    data = load_db()
+    def get_due_problems(self):
+        self.problems()
+        return [self._by_id[pid] for pid in self._due_index.ids_until(_today_ordinal())]
 
-    for p in data:
-        if p["title"] == problem_title:
-            current_best = p.get("best_time_seconds")
+    def get_forecast(self, days):
+        self.problems()
+        return [
+            (date, self._due_index.load(to_ordinal(date)))
+            for date in upcoming_dates(days)
+        ]
+
+    def warm_sort_orders(self):
+        # Called from the loader thread. Each order is built and installed
+        # under the lock, one at a time, so a review on the UI thread waits
+        # for at most one sort.
+        self.problems()
+        for order in SORT_KEYS:
+            with self._lock:
+                self._orders.ordered(order)
+
+    def _sorted(self, order, ids=None, reverse=False):
+        entries = self._orders.ordered(order)
+        if ids is None:
+            problems = list(entries)
+        elif len(ids) * SORT_SCAN_RATIO < len(entries):
+            return sort_problems((self._by_id[pid] for pid in ids), order, reverse)
+        else:
+            problems = [p for p in entries if p.id in ids]
+        if reverse:
+            problems.reverse()
+        return problems
+
+    def get_all_problems(self, order="date_solved", reverse=False):
+        self.problems()
+        return self._sorted(order, reverse=reverse)
+
+    def _due_ids(self, filters):
+        days = filters.get("due_within")
+        if days is None:
+            return None
+        return set(self._due_index.ids_until(_today_ordinal() + days))
+
+    def filter_problems(self, filters, order="date_solved", reverse=False):
+        self.problems()
+        ids = self._facets.match(filters, self._due_ids(filters))
+        return self._sorted(order, ids, reverse)
+
+    def facet_counts(self, filters):
+        self.problems()
+        return self._facets.counts(filters, self._due_ids(filters))
+
+    def sample_problems(self, n, topics=None, difficulties=None, weakness=False):
+        self.problems()
+        return sample_from(
+            self._buckets, self._by_id.__getitem__, n, topics, difficulties, weakness
+        )
+
+    def get_stats(self):
+        self.problems()
+        stats = self._stats_index.summary()
+        stats["due"] = self._due_index.count_until(_today_ordinal())
+        return stats
+
+    def _load_on(self, days):
+        return self._due_index.load(_today_ordinal() + days)
+
+    def deck_summary(self):
+        # Runs on the writer thread; the lock keeps mutations out meanwhile.
+        with self._lock:
+            self.problems()
+            return {
+                "total": len(self._stats_index),
+                "mastered": self._stats_index.by_status["Mastered"],
+                "due": {to_text(day): n for day, n in self._due_index.per_day()},
+            }
+
+    def mark_reviewed(self, problem_id):
+        with self._transaction():
+            p = self._by_id.get(problem_id)
+            if p is None:
+                return False, "Problem not found."
+            changes, msg = review_changes(p, self._load_on)
+            if changes is None:
+                return False, msg
+            before = {key: p[key] for key in changes}
+            self._apply_changes(p, changes)
+            self._log("review", id=problem_id, set=changes)
+            self.oplog.record("review", problem_id, p.title, before, changes)
+        return True, msg
+
+    def reset_problem(self, problem_id):
+        with self._transaction():
+            p = self._by_id.get(problem_id)
+            if p is None:
+                return False, "Problem not found."
+            changes = reset_changes(p)
+            before = {key: p[key] for key in changes}
+            self._apply_changes(p, changes)
+            self._log("reset", id=problem_id, set=changes)
+            self.oplog.record("reset", problem_id, p.title, before, changes)
+        return True, f"Reset {p['title']} to zero."
+
+    def apply_next_reviews(self, next_reviews):
+        # Bulk path for the scheduling module: one index rebuild instead of
+        # an insort per problem, and one journal line for the whole plan.
+        with self._transaction():
+            self._set_next_reviews(next_reviews)
+            if next_reviews:
+                self._log("replan", dates=next_reviews)
+        return len(next_reviews)
+
+    def update_best_time(self, problem_id, seconds):
+        with self._transaction():
+            p = self._by_id.get(problem_id)
+            if p is None:
+                return None, None
+            current_best = p.best_time_seconds
             if current_best is None or seconds < current_best:
-                p["best_time_seconds"] = seconds
-                save_db(data)
+                changes = {"best_time_seconds": seconds}
+                self._apply_changes(p, changes)
+                self._log("best_time", id=problem_id, set=changes)
+                self.oplog.record(
+                    "best_time",
+                    problem_id,
+                    p.title,
+                    {"best_time_seconds": current_best},
+                    changes,
+                )
                 return True, seconds
-            return False, current_best
+        return False, current_best
+
+    def _swap(self, problem_id, expected, target, op_name):
+        # Moves one problem from `expected` to `target` for the op log,
+        # refusing if something else changed it in between. None stands for
+        # the problem not existing.
+        with self._transaction():
+            p = self._by_id.get(problem_id)
+            if expected is None:
+                if p is not None or target["title"] in self._by_title:
+                    return False
+                self._add_record(Problem.from_dict(target))
+                self._log("add", record=target)
+                return True
+            if p is None or any(p[key] != value for key, value in expected.items()):
+                return False
+            if target is None:
+                self._remove_record(p)
+                self._log("remove", id=problem_id)
+            else:
+                self._apply_changes(p, target)
+                self._log(op_name, id=problem_id, set=target)
+        return True
+
+    def undo(self):
+        return self.oplog.undo(self._swap)
+
+    def redo(self):
+        return self.oplog.redo(self._swap)
+
+
+_repository = None
+# Workers and the UI thread all reach for the repository; after a deck
+# switch only one of them may close the old one and open the new one.
+_repository_lock = threading.Lock()
+_deck = None
+
+
+def _backend():
+    return os.environ.get("RECALL_BACKEND", "json")
+
+
+def deck_path(name):
+    if name == DEFAULT_DECK:
+        return DB_FILE
+    return os.path.join(DECKS_DIR, name + ".json")
+
 
-    return None, None
+def current_deck():
+    return _deck or load_config().get("deck") or DEFAULT_DECK
+
+
+def list_decks():
+    names = {DEFAULT_DECK, current_deck()}
+    if os.path.isdir(DECKS_DIR):
+        for entry in os.listdir(DECKS_DIR):
+            name, ext = os.path.splitext(entry)
+            if ext in (".json", ".journal", ".sqlite3", ".summary"):
+                names.add(name)
+    return sorted(names, key=lambda name: (name != DEFAULT_DECK, name.casefold()))
+
+
+def use_deck(name, remember=True):
+    # Only switches which files the next call opens; the deck is parsed
+    # when first used, and the previous one is let go.
+    global _deck
+    name = name.strip()
+    if not DECK_NAME.fullmatch(name):
+        return False, "Deck names use letters, digits, spaces, '.', '_' and '-'."
+    if name not in list_decks():
+        # A new deck is listed from the start, before anything is logged.
+        os.makedirs(DECKS_DIR, exist_ok=True)
+        write_summary(
+            summary_path(deck_path(name)), {"total": 0, "mastered": 0, "due": {}}
+        )
+    _deck = name
+    if remember:
+        config = load_config()
+        if config.get("deck") != name:
+            config["deck"] = name
+            writer.submit(("config", CONFIG_FILE), lambda: save_config(dict(config)))
+    return True, f"Switched to deck {name}."
+
+
+def _repository_path(json_path):
+    if _backend() == "sqlite":
+        return os.path.splitext(json_path)[0] + ".sqlite3"
+    return json_path
+
+
+def _open_repository(path):
+    if _backend() == "sqlite":
+        from .sqlite_db import SQLiteRepository
+
+        return SQLiteRepository(path)
+    return ProblemRepository(path)
+
+
+def get_repository():
+    global _repository
+    path = _repository_path(deck_path(current_deck()))
+    repository = _repository
+    if repository is not None and repository.path == path:
+        return repository
+    with _repository_lock:
+        if _repository is None or _repository.path != path:
+            if _repository is not None:
+                # Jobs queued for the old deck still use it. Closing it
+                # before the new one opens also matters to SQLite, which
+                # keeps a closed connection's file open while another one
+                # has the same file.
+                writer.flush()
+                _repository.close()
+            _repository = _open_repository(path)
+        return _repository
+
+
+def summary_path(path):
+    return os.path.splitext(path)[0] + ".summary"
+
+
+def write_summary(path, summary):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(summary, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+_summaries = {}
+
+
+def read_summary(path):
+    stamp = _file_stamp(path)
+    if stamp is None:
+        return None
+    cached = _summaries.get(path)
+    if cached is None or cached[0] != stamp:
+        try:
+            with open(path) as f:
+                cached = _summaries[path] = (stamp, json.load(f))
+        except (OSError, ValueError):
+            return None
+    return cached[1]
+
+
+def _changed():
+    # Keeps the active deck's summary file current for other decks' "due
+    # everywhere" counts; written off the UI thread, bursts coalesced.
+    repo = get_repository()
+    path = summary_path(repo.path)
+    writer.submit(("summary", path), lambda: write_summary(path, repo.deck_summary()))
+
+
+def _deck_summary(name):
+    path = summary_path(deck_path(name))
+    summary = read_summary(path)
+    if summary is None:
+        # Written before decks had summaries: read it this once.
+        repo = _open_repository(_repository_path(deck_path(name)))
+        try:
+            summary = repo.deck_summary()
+        finally:
+            repo.close()
+        write_summary(path, summary)
+    return summary
+
+
+def summaries_stamp():
+    # Summary files are only ever replaced by a rename, which touches the
+    # directory holding them: a cheap test for "some deck changed". Due
+    # counts also move with the date.
+    return (
+        _today(),
+        _file_stamp(os.path.dirname(DB_FILE) or "."),
+        _file_stamp(DECKS_DIR),
+    )
+
+
+@profiling.timed("db.get_deck_summaries")
+def get_deck_summaries(include_active=True):
+    # Totals per deck without parsing the inactive ones: their summary
+    # files keep review counts per day, so "due" stays right as days pass.
+    # Without the active deck only the files are read, so a worker thread
+    # can call it; a deck with no summary yet is parsed there once.
+    today = _today()
+    active = current_deck()
+    rows = []
+    for name in list_decks():
+        if name != active:
+            stats = _deck_summary(name)
+            due = sum(n for day, n in stats["due"].items() if day <= today)
+        elif include_active:
+            stats = get_stats()
+            due = stats["due"]
+        else:
+            continue
+        rows.append(
+            {
+                "deck": name,
+                "total": stats["total"],
+                "mastered": stats["mastered"],
+                "due": due,
+                "active": name == active,
+            }
+        )
+    return rows
+
+
+@profiling.timed("db.add_problem")
+def add_problem(title, difficulty, topic, url="", schedule=DEFAULT_SCHEDULE):
+    result = get_repository().add_problem(title, difficulty, topic, url, schedule)
+    _changed()
+    return result
+
+
+@profiling.timed("db.add_problems")
+def add_problems(records):
+    result = get_repository().add_problems(records)
+    _changed()
+    return result
+
+
+def iter_problems():
+    return get_repository().iter_problems()
+
+
+@profiling.timed("db.get_due_problems")
+def get_due_problems():
+    return get_repository().get_due_problems()
+
+
+@profiling.timed("db.get_all_problems")
+def get_all_problems(order="date_solved", reverse=False):
+    return get_repository().get_all_problems(order, reverse)
+
+
+@profiling.timed("db.filter_problems")
+def filter_problems(filters, order="date_solved", reverse=False):
+    return get_repository().filter_problems(filters, order, reverse)
+
+
+@profiling.timed("db.warm_sort_orders")
+def warm_sort_orders():
+    get_repository().warm_sort_orders()
+
+
+@profiling.timed("db.poll_changes")
+def poll_changes():
+    return get_repository().poll_changes()
+
+
+@profiling.timed("db.get_facet_counts")
+def get_facet_counts(filters):
+    return get_repository().facet_counts(filters)
+
+
+@profiling.timed("db.sample_problems")
+def sample_problems(n, topics=None, difficulties=None, weakness=False):
+    return get_repository().sample_problems(n, topics, difficulties, weakness)
+
+
+def get_random_problems(n: int):
+    return sample_problems(n)
+
+
+@profiling.timed("db.get_stats")
+def get_stats():
+    return get_repository().get_stats()
+
+
+@profiling.timed("db.get_forecast")
+def get_forecast(days=7):
+    return get_repository().get_forecast(days)
+
+
+@profiling.timed("db.get_search_index")
+def get_search_index():
+    return get_repository().search_index()
+
+
+@profiling.timed("db.get_problem")
+def get_problem(problem_id):
+    return get_repository().get_problem(problem_id)
+
+
+@profiling.timed("db.find_problem")
+def find_problem(title):
+    return get_repository().find_problem(title)
+
+
+@profiling.timed("db.mark_reviewed")
+def mark_reviewed(problem_id):
+    result = get_repository().mark_reviewed(problem_id)
+    _changed()
+    return result
+
+
+@profiling.timed("db.reset_problem")
+def reset_problem(problem_id):
+    result = get_repository().reset_problem(problem_id)
+    _changed()
+    return result
+
+
+@profiling.timed("db.update_best_time")
+def update_best_time(problem_id, seconds):
+    result = get_repository().update_best_time(problem_id, seconds)
+    _changed()
+    return result
+
+
+UNDO_LABELS = {
+    "add": "adding",
+    "review": "review of",
+    "reset": "reset of",
+    "best_time": "best time for",
+}
+
+
+def _undo_message(op, done, verb):
+    if op is None:
+        return False, f"Nothing to {verb.lower()}."
+    if not done:
+        return False, f"{op.title} has changed since; cannot {verb.lower()}."
+    return True, f"{verb}: {UNDO_LABELS[op.kind]} {op.title}."
+
+
+@profiling.timed("db.undo")
+def undo():
+    op, done = get_repository().undo()
+    _changed()
+    return _undo_message(op, done, "Undo")
+
+
+@profiling.timed("db.redo")
+def redo():
+    op, done = get_repository().redo()
+    _changed()
+    return _undo_message(op, done, "Redo")
+
+
+def _replan(plan):
+    repository = get_repository()
+    changed = repository.apply_next_reviews(plan(list(repository.iter_problems())))
+    _changed()
+    return changed
+
+
+@profiling.timed("db.shift_reviews")
+def shift_reviews(days):
+    return _replan(lambda problems: scheduling.shift(problems, days))
+
+
+@profiling.timed("db.replan_reviews")
+def replan_reviews():
+    schedules = get_schedules()
+    return _replan(
+        lambda problems: scheduling.replan(problems, schedules, DEFAULT_SCHEDULE)
+    )
+
+
+@profiling.timed("db.balance_reviews")
+def balance_reviews(cap, start=None):
+    start = start or _today()
+    return _replan(lambda problems: scheduling.balance(problems, cap, start))
+
+
+_history = None
+
+
+def get_history():
+    # Kept apart from the problem records and only read on first use, so
+    # attempt history never slows down loading the deck.
+    global _history
+    path = os.path.splitext(deck_path(current_deck()))[0] + ".history"
+    if _history is None or _history.path != path:
+        _history = AttemptHistory(path)
+    return _history
+
+
+@profiling.timed("db.record_attempt")
+def record_attempt(problem_id, seconds, source="normal"):
+    history = get_history()
+    history.append(problem_id, seconds, source)
+    writer.submit(("history", history.path), history.flush)
+    return update_best_time(problem_id, seconds)
+
+
+@profiling.timed("db.get_attempt_stats")
+def get_attempt_stats(problem_id):
+    return get_history().problem_summary(problem_id)
+
+
+@profiling.timed("db.get_topic_attempt_stats")
+def get_topic_attempt_stats():
+    topics = {p["id"]: p["topic"] for p in iter_problems()}
+    return get_history().topic_summary(topics)
 
 
 CONFIG_FILE = "recall_config.json"
 
 
+_config = None
+
+
+@profiling.timed("db.load_config")
 def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        return {}
-    with open(CONFIG_FILE, "r") as f:
-        return json.load(f)
+    global _config
+    if _config is None:
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, "r") as f:
+                _config = json.load(f)
+        else:
+            _config = {}
+    return _config
 
 
+@profiling.timed("db.save_config")
 def save_config(config):
     with open(CONFIG_FILE, "w") as f:
         json.dump(config, f, indent=2)
@@ -157,4 +1329,20 @@ def get_theme():
 def set_theme(theme_name):
     config = load_config()
     config["theme"] = theme_name
-    save_config(config)
+    writer.submit(("config", CONFIG_FILE), lambda: save_config(dict(config)))
+
+
+def get_test_spec():
+    return load_config().get("test_mode", "")
+
+
+def set_test_spec(text):
+    config = load_config()
+    if config.get("test_mode") == text:
+        return
+    config["test_mode"] = text
+    writer.submit(("config", CONFIG_FILE), lambda: save_config(dict(config)))
+
+
+def flush():
+    writer.flush()
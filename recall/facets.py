@@ -0,0 +1,97 @@
+import re
+
+from .sampling import DIFFICULTY_ALIASES, TOPIC_ALIASES
+
+# Facet tokens typed into the search box, e.g. "topic:dp,graphs diff:m
+# stage:0-2 url:no due:7 two sum". Everything that is not a known key:value
+# token is left over for the text search.
+KEYS = {
+    "topic": "topic",
+    "t": "topic",
+    "diff": "difficulty",
+    "difficulty": "difficulty",
+    "d": "difficulty",
+    "status": "status",
+    "s": "status",
+    "stage": "stage",
+    "url": "has_url",
+    "due": "due_within",
+}
+STATUSES = {"active": "Active", "mastered": "Mastered"}
+_YES = {"yes", "y", "true", "1"}
+_NO = {"no", "n", "false", "0"}
+_TOKEN = re.compile(r"(\w+):(\S*)$")
+
+
+def _squash(text):
+    return re.sub(r"[^a-z0-9]", "", text.casefold())
+
+
+_VALUES = {
+    facet: {_squash(alias): full for alias, full in aliases.items()}
+    for facet, aliases in (
+        ("topic", TOPIC_ALIASES),
+        ("difficulty", DIFFICULTY_ALIASES),
+        ("status", STATUSES),
+    )
+}
+
+
+def _lookup(value, table):
+    # Exact alias first, then a unique prefix of one of the aliases.
+    key = _squash(value)
+    if key in table:
+        return table[key]
+    hits = {full for alias, full in table.items() if alias.startswith(key)}
+    return hits.pop() if len(hits) == 1 else None
+
+
+def _parse_stage(value):
+    low, sep, high = value.partition("-")
+    if value.endswith("+"):
+        return int(value[:-1]), 10**9
+    if sep:
+        return int(low), int(high)
+    return int(value), int(value)
+
+
+def parse_query(text):
+    filters, words, errors = {}, [], []
+    for word in text.split():
+        match = _TOKEN.match(word)
+        facet = KEYS.get(match.group(1).casefold()) if match else None
+        if facet is None:
+            words.append(word)
+            continue
+        value = match.group(2)
+        if not value:
+            continue
+        try:
+            if facet in _VALUES:
+                picked = []
+                for part in value.split(","):
+                    if not part:
+                        continue
+                    full = _lookup(part, _VALUES[facet])
+                    if full is None:
+                        raise ValueError(f"unknown {facet} {part!r}")
+                    picked.append(full)
+                if picked:
+                    filters[facet] = sorted(set(picked))
+            elif facet == "stage":
+                filters[facet] = _parse_stage(value)
+            elif facet == "has_url":
+                if value.casefold() not in _YES | _NO:
+                    raise ValueError(f"url: expects yes or no, not {value!r}")
+                filters[facet] = value.casefold() in _YES
+            else:
+                days = 0 if value.casefold() == "today" else int(value)
+                if days < 0:
+                    raise ValueError("due: expects a number of days")
+                filters[facet] = days
+        except ValueError as e:
+            message = str(e)
+            if message.startswith("invalid literal"):
+                message = f"bad value for {match.group(1)}: {value!r}"
+            errors.append(message)
+    return filters, " ".join(words), errors
@@ -0,0 +1,152 @@
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import insort
+from heapq import merge
+
+# One fixed-size record per attempt: problem id, unix timestamp, seconds,
+# source. The file is append-only; a torn trailing record is dropped on load.
+RECORD = struct.Struct("<IIIB")
+SOURCES = ("normal", "test")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _spread(n, sx, sy, sxy, sxx):
+    # Centered sums of squares for a least-squares fit of seconds against
+    # attempt number; adding them across problems gives a pooled slope.
+    if n < 2:
+        return 0.0, 0.0
+    return sxy - sx * sy / n, sxx - sx * sx / n
+
+
+def _summary(times, fits):
+    sxy = sxx = 0.0
+    for fit in fits:
+        xy, xx = _spread(*fit)
+        sxy += xy
+        sxx += xx
+    return {
+        "attempts": len(times),
+        "median": percentile(times, 50),
+        "p90": percentile(times, 90),
+        # Seconds gained (negative) or lost per repeat attempt.
+        "trend": round(sxy / sxx, 1) if sxx else None,
+    }
+
+
+class AttemptHistory:
+    def __init__(self, path):
+        self.path = path
+        self.problem_ids = array("I")
+        self.timestamps = array("I")
+        self.seconds = array("I")
+        self.sources = array("B")
+        self._sorted = {}
+        self._fits = {}
+        self._pending = bytearray()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        self._load()
+        return len(self.problem_ids)
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                usable = len(raw) - len(raw) % RECORD.size
+                if usable != len(raw):
+                    with open(self.path, "r+b") as f:
+                        f.truncate(usable)
+                for record in RECORD.iter_unpack(raw[:usable]):
+                    self._add(*record)
+            self._loaded = True
+
+    def _add(self, problem_id, timestamp, seconds, source):
+        self.problem_ids.append(problem_id)
+        self.timestamps.append(timestamp)
+        self.seconds.append(seconds)
+        self.sources.append(source)
+        insort(self._sorted.setdefault(problem_id, []), seconds)
+        fit = self._fits.setdefault(problem_id, [0, 0, 0, 0, 0])
+        x = fit[0]
+        fit[0] += 1
+        fit[1] += x
+        fit[2] += seconds
+        fit[3] += x * seconds
+        fit[4] += x * x
+
+    def append(self, problem_id, seconds, source="normal", timestamp=None):
+        self._load()
+        record = (
+            problem_id,
+            int(time.time() if timestamp is None else timestamp),
+            int(seconds),
+            SOURCES.index(source),
+        )
+        with self._lock:
+            self._add(*record)
+            self._pending += RECORD.pack(*record)
+
+    def flush(self):
+        with self._lock:
+            chunk, self._pending = bytes(self._pending), bytearray()
+            if not chunk:
+                return
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                self._pending[:0] = chunk
+                raise
+
+    def attempts(self, problem_id):
+        self._load()
+        return [
+            {
+                "timestamp": self.timestamps[i],
+                "seconds": self.seconds[i],
+                "source": SOURCES[self.sources[i]],
+            }
+            for i, pid in enumerate(self.problem_ids)
+            if pid == problem_id
+        ]
+
+    def problem_summary(self, problem_id):
+        self._load()
+        times = self._sorted.get(problem_id)
+        if not times:
+            return None
+        return _summary(times, [self._fits[problem_id]])
+
+    def topic_summary(self, topic_by_id):
+        self._load()
+        ids_by_topic = {}
+        for pid in self._sorted:
+            topic = topic_by_id.get(pid)
+            if topic is not None:
+                ids_by_topic.setdefault(topic, []).append(pid)
+        return {
+            topic: _summary(
+                list(merge(*(self._sorted[pid] for pid in ids))),
+                [self._fits[pid] for pid in ids],
+            )
+            for topic, ids in ids_by_topic.items()
+        }
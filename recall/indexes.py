@@ -0,0 +1,338 @@
+import random
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+
+# Sorts after any problem id, so (date, _LAST_ID) bounds every entry on that date.
+_LAST_ID = float("inf")
+
+
+class DueIndex:
+    # Active problems as sorted (due day ordinal, id) pairs.
+    def __init__(self, problems=()):
+        self._dates = {p.id: p.due_on for p in problems if p.status == "Active"}
+        self._entries = sorted((date, pid) for pid, date in self._dates.items())
+        self._per_day = Counter(self._dates.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def discard(self, problem_id):
+        date = self._dates.pop(problem_id, None)
+        if date is not None:
+            i = bisect_left(self._entries, (date, problem_id))
+            del self._entries[i]
+            self._per_day[date] -= 1
+            if not self._per_day[date]:
+                del self._per_day[date]
+
+    def update(self, p):
+        self.discard(p.id)
+        if p.status == "Active":
+            self._dates[p.id] = p.due_on
+            insort(self._entries, (p.due_on, p.id))
+            self._per_day[p.due_on] += 1
+
+    def load(self, date):
+        return self._per_day[date]
+
+    def per_day(self):
+        return sorted(self._per_day.items())
+
+    def count_until(self, date):
+        return bisect_right(self._entries, (date, _LAST_ID))
+
+    def ids_until(self, date):
+        return [pid for _, pid in self._entries[: self.count_until(date)]]
+
+
+class StatsIndex:
+    def __init__(self, problems=()):
+        self._keys = {}
+        self.by_status = Counter()
+        self.by_topic = Counter()
+        self.by_difficulty = Counter()
+        self.by_stage = Counter()
+        self.mastered_by_topic = Counter()
+        self.timed_by_topic = Counter()
+        self.best_sum_by_topic = Counter()
+        self._best_times = []
+        for p in problems:
+            self.update(p)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _key(p):
+        return (p.status, p.topic, p.difficulty, p.review_stage, p.best_time_seconds)
+
+    def _count(self, key, sign):
+        status, topic, difficulty, stage, best = key
+        self.by_status[status] += sign
+        self.by_topic[topic] += sign
+        self.by_difficulty[difficulty] += sign
+        self.by_stage[stage] += sign
+        if status == "Mastered":
+            self.mastered_by_topic[topic] += sign
+        if best is not None:
+            self.timed_by_topic[topic] += sign
+            self.best_sum_by_topic[topic] += sign * best
+            if sign > 0:
+                insort(self._best_times, best)
+            else:
+                del self._best_times[bisect_left(self._best_times, best)]
+
+    def update(self, p):
+        key = self._key(p)
+        old = self._keys.get(p.id)
+        if old == key:
+            return
+        if old is not None:
+            self._count(old, -1)
+        self._keys[p.id] = key
+        self._count(key, 1)
+
+    def discard(self, problem_id):
+        old = self._keys.pop(problem_id, None)
+        if old is not None:
+            self._count(old, -1)
+
+    def best_time_summary(self):
+        times = self._best_times
+        if not times:
+            return {"count": 0, "fastest": None, "median": None}
+        return {
+            "count": len(times),
+            "fastest": times[0],
+            "median": times[len(times) // 2],
+        }
+
+    def topic_summary(self):
+        summary = {}
+        for topic, total in self.by_topic.items():
+            if total <= 0:
+                continue
+            timed = self.timed_by_topic[topic]
+            summary[topic] = {
+                "total": total,
+                "mastered": self.mastered_by_topic[topic],
+                "best_avg": (
+                    round(self.best_sum_by_topic[topic] / timed) if timed else None
+                ),
+            }
+        return summary
+
+    def summary(self):
+        return {
+            "total": len(self._keys),
+            "mastered": self.by_status["Mastered"],
+            "by_topic": self.topic_summary(),
+            "by_difficulty": {k: v for k, v in self.by_difficulty.items() if v > 0},
+            "by_stage": {k: v for k, v in sorted(self.by_stage.items()) if v > 0},
+            "best_time": self.best_time_summary(),
+        }
+
+
+class BucketIndex:
+    # Problem ids grouped by (topic, difficulty). Buckets are plain lists
+    # with swap-remove, so membership changes are O(1) and random.sample
+    # can draw from a bucket directly.
+    def __init__(self, problems=()):
+        self._buckets = {}
+        self._where = {}
+        for p in problems:
+            self.update(p)
+
+    def __len__(self):
+        return len(self._where)
+
+    @staticmethod
+    def _key(p):
+        return (p.topic, p.difficulty)
+
+    def discard(self, problem_id):
+        where = self._where.pop(problem_id, None)
+        if where is None:
+            return
+        key, i = where
+        bucket = self._buckets[key]
+        last = bucket.pop()
+        if last != problem_id:
+            bucket[i] = last
+            self._where[last] = (key, i)
+
+    def update(self, p):
+        key = self._key(p)
+        where = self._where.get(p.id)
+        if where is not None and where[0] == key:
+            return
+        self.discard(p.id)
+        bucket = self._buckets.setdefault(key, [])
+        self._where[p.id] = (key, len(bucket))
+        bucket.append(p.id)
+
+    def count(self, topics=None, difficulties=None):
+        return sum(len(ids) for ids in self._matching(topics, difficulties))
+
+    def _matching(self, topics, difficulties):
+        return [
+            ids
+            for (topic, difficulty), ids in self._buckets.items()
+            if ids
+            and (not topics or topic in topics)
+            and (not difficulties or difficulty in difficulties)
+        ]
+
+    def sample(self, n, topics=None, difficulties=None, rng=random):
+        # Deal the n draws round-robin over the matching buckets, so every
+        # topic/difficulty pair gets an equal share while it has problems.
+        buckets = self._matching(topics, difficulties)
+        rng.shuffle(buckets)
+        take = [0] * len(buckets)
+        left = n
+        while left and buckets:
+            dealt = False
+            for i, ids in enumerate(buckets):
+                if left and take[i] < len(ids):
+                    take[i] += 1
+                    left -= 1
+                    dealt = True
+            if not dealt:
+                break
+        picked = [
+            pid for ids, k in zip(buckets, take) if k for pid in rng.sample(ids, k)
+        ]
+        rng.shuffle(picked)
+        return picked
+
+
+class SortIndex:
+    # The deck in each sort order, built on first use and then kept sorted
+    # by bisection. Keys end in the problem id, so every entry can be found
+    # by its key: discard() must see a problem before it changes, update()
+    # after.
+    def __init__(self, keys, problems=()):
+        self._keys = keys
+        self._problems = problems
+        self._orders = {}
+
+    def __len__(self):
+        return len(self._problems)
+
+    def ordered(self, order):
+        entries = self._orders.get(order)
+        if entries is None:
+            key = self._keys[order]
+            entries = self._orders[order] = sorted(self._problems, key=key)
+        return entries
+
+    def forget(self, order):
+        # For bulk changes: re-sorting once beats moving every entry.
+        self._orders.pop(order, None)
+
+    def discard(self, p):
+        for order, entries in self._orders.items():
+            key = self._keys[order]
+            i = bisect_left(entries, key(p), key=key)
+            if i < len(entries) and entries[i] is p:
+                del entries[i]
+
+    def update(self, p):
+        for order, entries in self._orders.items():
+            insort(entries, p, key=self._keys[order])
+
+
+FACETS = ("topic", "difficulty", "status", "stage", "has_url")
+
+
+class FacetIndex:
+    # Inverted index: facet -> value -> set of problem ids. A filter picks
+    # values per facet; facets are combined by intersecting their sets,
+    # smallest first.
+    def __init__(self, problems=()):
+        self._sets = {facet: {} for facet in FACETS}
+        self._keys = {}
+        for p in problems:
+            self.update(p)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _key(p):
+        return (p.topic, p.difficulty, p.status, p.review_stage, bool(p.url))
+
+    def discard(self, problem_id):
+        old = self._keys.pop(problem_id, None)
+        if old is None:
+            return
+        for facet, value in zip(FACETS, old):
+            ids = self._sets[facet][value]
+            ids.discard(problem_id)
+            if not ids:
+                del self._sets[facet][value]
+
+    def update(self, p):
+        key = self._key(p)
+        if self._keys.get(p.id) == key:
+            return
+        self.discard(p.id)
+        self._keys[p.id] = key
+        for facet, value in zip(FACETS, key):
+            self._sets[facet].setdefault(value, set()).add(p.id)
+
+    def _selected(self, facet, wanted):
+        values = self._sets[facet]
+        if facet == "stage":
+            low, high = wanted
+            keys = [v for v in values if low <= v <= high]
+        elif facet == "has_url":
+            keys = [wanted]
+        else:
+            keys = wanted
+        sets = [values[v] for v in keys if v in values]
+        if len(sets) == 1:
+            return sets[0]
+        return set().union(*sets)
+
+    def _constraints(self, filters, extra):
+        sets = {
+            facet: self._selected(facet, filters[facet])
+            for facet in FACETS
+            if filters.get(facet) is not None
+        }
+        if extra is not None:
+            sets["extra"] = extra
+        return sets
+
+    @staticmethod
+    def _intersect(sets):
+        # None means unconstrained. The result may be one of the index's
+        # own sets, so callers must not modify it.
+        if not sets:
+            return None
+        ordered = sorted(sets, key=len)
+        if len(ordered) == 1:
+            return ordered[0]
+        return ordered[0].intersection(*ordered[1:])
+
+    def match(self, filters, extra=None):
+        found = self._intersect(list(self._constraints(filters, extra).values()))
+        return set(self._keys) if found is None else found
+
+    def counts(self, filters, extra=None):
+        # Per facet value, how many problems match it together with the
+        # filters on every other facet.
+        sets = self._constraints(filters, extra)
+        counts = {}
+        for facet in FACETS:
+            others = self._intersect([s for f, s in sets.items() if f != facet])
+            if others is None:
+                counts[facet] = {v: len(ids) for v, ids in self._sets[facet].items()}
+            else:
+                counts[facet] = {
+                    v: n
+                    for v, ids in self._sets[facet].items()
+                    if (n := len(ids & others))
+                }
+        return counts
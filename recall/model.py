@@ -0,0 +1,157 @@
+import sys
+from collections.abc import Mapping
+from datetime import date
+
+# Snapshot format history:
+#   0 - a bare list of records
+#   1 - {"next_id": N, "problems": [...]}; some records still use "topics"
+#   2 - adds "version"; every record has the full field set below
+SCHEMA_VERSION = 2
+
+FIELDS = (
+    "id",
+    "title",
+    "difficulty",
+    "topic",
+    "date_solved",
+    "last_reviewed",
+    "review_stage",
+    "next_review",
+    "status",
+    "url",
+    "best_time_seconds",
+    "schedule",
+)
+# Dates are held as day ordinals and only turned back into text at the edges.
+DATE_ATTRS = {
+    "date_solved": "solved_on",
+    "last_reviewed": "reviewed_on",
+    "next_review": "due_on",
+}
+_INTERNED = {"difficulty", "topic", "status", "schedule"}
+_PLAIN = set(FIELDS) - set(DATE_ATTRS)
+
+_ordinals = {}
+_texts = {}
+
+
+def to_ordinal(text):
+    value = _ordinals.get(text)
+    if value is None:
+        value = _ordinals[text] = date.fromisoformat(text).toordinal()
+    return value
+
+
+def to_text(ordinal):
+    text = _texts.get(ordinal)
+    if text is None:
+        text = _texts[ordinal] = date.fromordinal(ordinal).isoformat()
+    return text
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def migrate(records, version):
+    if version >= SCHEMA_VERSION:
+        return records
+    today = date.today().isoformat()
+    for r in records:
+        topic = r.pop("topics", None)
+        r.setdefault("topic", topic or "Unknown")
+        r.setdefault("date_solved", r.get("last_reviewed") or today)
+        r.setdefault("last_reviewed", r["date_solved"])
+        r.setdefault("next_review", r["last_reviewed"])
+        r.setdefault("review_stage", 0)
+        r.setdefault("status", "Active")
+        r.setdefault("url", "")
+        r.setdefault("best_time_seconds", None)
+        r.setdefault("schedule", None)
+    return records
+
+
+class Problem(Mapping):
+    __slots__ = (
+        "id",
+        "title",
+        "difficulty",
+        "topic",
+        "solved_on",
+        "reviewed_on",
+        "review_stage",
+        "due_on",
+        "status",
+        "url",
+        "best_time_seconds",
+        "schedule",
+    )
+    # A record is one problem, not a value: Mapping's field-by-field
+    # comparison would make list.remove/index build a dict per record.
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    @classmethod
+    def from_dict(cls, record):
+        p = cls()
+        p.id = record.get("id")
+        p.title = record["title"]
+        p.difficulty = _intern(record["difficulty"])
+        p.topic = _intern(record["topic"])
+        p.solved_on = to_ordinal(record["date_solved"])
+        p.reviewed_on = to_ordinal(record["last_reviewed"])
+        p.review_stage = record.get("review_stage", 0)
+        p.due_on = to_ordinal(record["next_review"])
+        p.status = _intern(record.get("status", "Active"))
+        p.url = record.get("url") or ""
+        p.best_time_seconds = record.get("best_time_seconds")
+        p.schedule = _intern(record.get("schedule"))
+        return p
+
+    def __getitem__(self, key):
+        attr = DATE_ATTRS.get(key)
+        if attr is not None:
+            return to_text(getattr(self, attr))
+        if key in _PLAIN:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        attr = DATE_ATTRS.get(key)
+        if attr is not None:
+            setattr(self, attr, to_ordinal(value))
+        elif key in _INTERNED:
+            setattr(self, key, _intern(value))
+        elif key in _PLAIN:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def update(self, changes):
+        for key, value in changes.items():
+            self[key] = value
+
+    def __contains__(self, key):
+        return key in DATE_ATTRS or key in _PLAIN
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def to_dict(self):
+        return {key: self[key] for key in FIELDS}
+
+    def __repr__(self):
+        return f"Problem({self.to_dict()!r})"
+
+
+def load_records(records, version=SCHEMA_VERSION):
+    return [Problem.from_dict(r) for r in migrate(records, version)]
@@ -0,0 +1,43 @@
+from collections import deque, namedtuple
+
+UNDO_LIMIT = 100
+
+# One mutation of one problem, kept as the fields it changed before and
+# after. An add has no "before": undoing it removes the record.
+Op = namedtuple("Op", "kind problem_id title before after")
+
+
+class OpLog:
+    # Session undo/redo stacks. Undo keeps the newest `limit` operations;
+    # a fresh operation empties the redo stack.
+    def __init__(self, limit=UNDO_LIMIT):
+        self._undo = deque(maxlen=limit)
+        self._redo = deque(maxlen=limit)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def record(self, kind, problem_id, title, before, after):
+        self._undo.append(Op(kind, problem_id, title, before, after))
+        self._redo.clear()
+
+    def undo(self, swap):
+        # swap(problem_id, expected, target, op_name) -> whether the problem
+        # still looked like `expected` and now looks like `target`. An op
+        # that no longer applies is dropped rather than retried.
+        if not self._undo:
+            return None, False
+        op = self._undo.pop()
+        done = swap(op.problem_id, op.after, op.before, "undo")
+        if done:
+            self._redo.append(op)
+        return op, done
+
+    def redo(self, swap):
+        if not self._redo:
+            return None, False
+        op = self._redo.pop()
+        done = swap(op.problem_id, op.before, op.after, "redo")
+        if done:
+            self._undo.append(op)
+        return op, done
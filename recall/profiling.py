@@ -0,0 +1,152 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENV_VAR = "RECALL_PROFILE"
+MAX_EVENTS = 200_000
+
+_enabled = False
+_output = None
+_profiler = None
+_stats = {}
+_events = deque(maxlen=MAX_EVENTS)
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(output=None):
+    # output: "*.prof" runs cProfile for the session, any other path gets a
+    # Chrome trace of the recorded spans; both are written on exit.
+    global _enabled, _output, _profiler
+    if _enabled:
+        return
+    _enabled = True
+    _output = output if output and output not in ("1", "true", "yes") else None
+    if _output and _output.endswith(".prof"):
+        import cProfile
+
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(dump)
+
+
+def span(name):
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter())
+
+        return wrapper
+
+    return decorate
+
+
+def record(name, start, end):
+    duration = end - start
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            _stats[name] = [1, duration, duration]
+        else:
+            stat[0] += 1
+            stat[1] += duration
+            if duration > stat[2]:
+                stat[2] = duration
+        _events.append((name, start, duration, threading.get_ident()))
+
+
+def snapshot():
+    with _lock:
+        return {
+            name: {"count": count, "total_s": total, "max_s": worst}
+            for name, (count, total, worst) in _stats.items()
+        }
+
+
+def summary_lines(limit=12):
+    rows = sorted(snapshot().items(), key=lambda kv: -kv[1]["total_s"])[:limit]
+    lines = [f"{'span':<24} {'n':>6} {'avg ms':>8} {'max ms':>8}"]
+    for name, s in rows:
+        avg = s["total_s"] / s["count"] * 1000
+        lines.append(
+            f"{name:<24} {s['count']:>6} {avg:>8.2f} {s['max_s'] * 1000:>8.2f}"
+        )
+    return lines
+
+
+def write_chrome_trace(path):
+    with _lock:
+        events = list(_events)
+    trace = [
+        {
+            "name": name,
+            "ph": "X",
+            "ts": (start - _origin) * 1e6,
+            "dur": duration * 1e6,
+            "pid": os.getpid(),
+            "tid": tid,
+        }
+        for name, start, duration, tid in events
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+def dump():
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_output)
+    elif _output:
+        write_chrome_trace(_output)
+
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
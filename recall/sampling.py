@@ -0,0 +1,75 @@
+import heapq
+import random
+import re
+
+from . import constants
+
+DEFAULT_SIZE = 3
+MAX_SIZE = 50
+# Weakness sampling weighs a stratified pool this many times the test size,
+# so its cost depends on the test size and not on the deck.
+POOL_FACTOR = 8
+
+DIFFICULTY_ALIASES = {
+    value.casefold(): value for _, value in constants.DIFFICULTY_OPTIONS
+}
+DIFFICULTY_ALIASES.update(
+    {short.casefold(): diff for diff, short in constants.SHORT_DIFF.items()}
+)
+TOPIC_ALIASES = {value.casefold(): value for _, value in constants.TOPIC_OPTIONS}
+TOPIC_ALIASES.update(
+    {short.casefold(): topic for topic, short in constants.SHORT_TOPICS.items()}
+)
+_WEAK_WORDS = {"weak", "weakest", "weakness"}
+# Longest alias first, so "heap / priority queue" wins over "heap".
+_ALIASES = sorted(
+    [(alias, "topics", topic) for alias, topic in TOPIC_ALIASES.items()]
+    + [(alias, "difficulties", diff) for alias, diff in DIFFICULTY_ALIASES.items()],
+    key=lambda entry: -len(entry[0]),
+)
+_SEPARATORS = " /,+"
+
+
+def parse_spec(text):
+    # "5 Medium DP/Graphs", "10 weak hard", "" -> the default size.
+    spec = {"size": DEFAULT_SIZE, "topics": [], "difficulties": [], "weakness": False}
+    rest = text.casefold()
+    while True:
+        rest = rest.lstrip(_SEPARATORS)
+        if not rest:
+            return spec, None
+        word = re.match(r"[^ /,+]+", rest).group()
+        for alias, field, value in _ALIASES:
+            end = len(alias)
+            if rest.startswith(alias) and (end == len(rest) or not rest[end].isalnum()):
+                if value not in spec[field]:
+                    spec[field].append(value)
+                rest = rest[end:]
+                break
+        else:
+            if word.isdigit():
+                spec["size"] = int(word)
+                if not 1 <= spec["size"] <= MAX_SIZE:
+                    return None, f"size must be between 1 and {MAX_SIZE}"
+            elif word in _WEAK_WORDS:
+                spec["weakness"] = True
+            else:
+                return None, f"unknown topic or difficulty {word!r}"
+            rest = rest[len(word) :]
+
+
+def describe(spec):
+    parts = [str(spec["size"])]
+    if spec["weakness"]:
+        parts.append("weak")
+    parts.extend(spec["difficulties"])
+    if spec["topics"]:
+        parts.append("/".join(constants.SHORT_TOPICS.get(t, t) for t in spec["topics"]))
+    return " ".join(parts)
+
+
+def weighted_pick(items, n, weight, rng=random):
+    # Weighted sampling without replacement (Efraimidis-Spirakis): keep the
+    # n items with the largest u ** (1 / w).
+    keyed = ((rng.random() ** (1 / weight(item)), i) for i, item in enumerate(items))
+    return [items[i] for _, i in heapq.nlargest(n, keyed)]
@@ -0,0 +1,129 @@
+from functools import cache
+from itertools import accumulate
+
+from .model import to_ordinal, to_text
+
+# Bulk re-planning of next_review dates. Every function takes the deck and
+# returns {problem_id: new next_review} for the Active problems whose date
+# changes; applying the result is left to the repository. Problems already
+# hold their dates as day ordinals (see model.Problem).
+
+
+@cache
+def _numpy():
+    # NumPy is optional and slow to import; only bulk re-planning needs it,
+    # so the CLI and the app do not pay for it at startup.
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - NumPy is optional
+        return None
+    return numpy
+
+
+def _active(problems):
+    return [p for p in problems if p.status == "Active"]
+
+
+def _changes(active, ordinals):
+    return {
+        p.id: to_text(int(v)) for p, v in zip(active, ordinals) if int(v) != p.due_on
+    }
+
+
+def smooth(interval, load, cap):
+    # Pick the day offset for a review ideally `interval` days out: the
+    # least-loaded day within interval/5 of it, nearest the ideal on a tie,
+    # never earlier than tomorrow. If every day there is at `cap`, the first
+    # later day with room. `load(days)` is the number of reviews already
+    # due then.
+    spread = max(1, interval // 5)
+    window = range(max(1, interval - spread), interval + spread + 1)
+    n, _, days = min((load(d), abs(d - interval), d) for d in window)
+    if n < cap:
+        return days
+    days = window[-1] + 1
+    while load(days) >= cap:
+        days += 1
+    return days
+
+
+def shift(problems, days):
+    # Vacation: push every pending review back by the same number of days.
+    active = _active(problems)
+    current = [p.due_on for p in active]
+    np = _numpy()
+    if np is not None:
+        return _changes(active, np.asarray(current, dtype=np.int64) + days)
+    return _changes(active, [v + days for v in current])
+
+
+def replan(problems, schedules, default):
+    # Recompute next_review from last_reviewed and the problem's current
+    # stage, e.g. after a schedule definition changed. Stage 0 waits for
+    # the first interval, like a freshly logged problem.
+    active = _active(problems)
+    names = list(schedules)
+    index = {name: i for i, name in enumerate(names)}
+    fallback = index[default]
+    kinds = [index.get(p.schedule or default, fallback) for p in active]
+    stages = [p.review_stage for p in active]
+    last = [p.reviewed_on for p in active]
+    np = _numpy()
+
+    if np is not None:
+        width = max(len(schedules[name]) for name in names)
+        table = np.array(
+            [
+                schedules[name] + [schedules[name][-1]] * (width - len(schedules[name]))
+                for name in names
+            ],
+            dtype=np.int64,
+        )
+        lengths = np.array([len(schedules[name]) for name in names])
+        kinds = np.asarray(kinds, dtype=np.int64)
+        steps = np.clip(np.asarray(stages, dtype=np.int64), 1, lengths[kinds] - 1)
+        return _changes(active, np.asarray(last) + table[kinds, steps])
+
+    tables = [schedules[name] for name in names]
+    ordinals = []
+    for kind, stage, start in zip(kinds, stages, last):
+        intervals = tables[kind]
+        ordinals.append(start + intervals[min(max(stage, 1), len(intervals) - 1)])
+    return _changes(active, ordinals)
+
+
+def balance(problems, cap, start):
+    # Spread reviews so no day from `start` on holds more than `cap`. Reviews
+    # only ever move later, and keep their order. Walking the problems in
+    # date order, the i-th one lands on max(date[i], day[i - cap] + 1), so
+    # each of the cap interleaved chains is a running maximum.
+    if cap < 1:
+        raise ValueError("cap must be at least 1")
+    start = to_ordinal(start)
+    active = _active(problems)
+    dates = [p.due_on for p in active]
+    order = sorted(
+        (i for i, d in enumerate(dates) if d >= start),
+        key=lambda i: (dates[i], active[i].id),
+    )
+    if not order:
+        return {}
+    pending = [active[i] for i in order]
+    wanted = [dates[i] for i in order]
+    np = _numpy()
+
+    if np is not None:
+        rows = -(-len(wanted) // cap)
+        grid = np.full(rows * cap, wanted[-1], dtype=np.int64)
+        grid[: len(wanted)] = wanted
+        grid = grid.reshape(rows, cap)
+        k = np.arange(rows, dtype=np.int64)[:, None]
+        placed = (np.maximum.accumulate(grid - k, axis=0) + k).ravel()
+        return _changes(pending, placed[: len(wanted)])
+
+    placed = [0] * len(wanted)
+    for col in range(cap):
+        chain = wanted[col::cap]
+        lifted = accumulate((d - k for k, d in enumerate(chain)), max)
+        placed[col::cap] = [v + k for k, v in enumerate(lifted)]
+    return _changes(pending, placed)
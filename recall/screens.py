@@ -19,10 +19,7 @@ from textual.widgets import (
 from . import constants
 from . import crypto
 from . import database
-
-
-class SearchInput(Input):
-    BINDINGS = [("ctrl+f", "app.focus_search", "Focus Table")]
+from . import sampling
 
 
 class AddModal(ModalScreen):
@@ -40,6 +37,13 @@ class AddModal(ModalScreen):
             )
             yield Label("Topic:")
             yield Select(constants.TOPIC_OPTIONS, prompt="Select Topic", id="topic")
+            yield Label("Review Schedule:")
+            yield Select(
+                constants.SCHEDULE_OPTIONS,
+                value=database.DEFAULT_SCHEDULE,
+                allow_blank=False,
+                id="schedule",
+            )
             yield Label("URL (Optional):")
             yield Input(placeholder="e.g. https://leetcode.com/...", id="url")
             with Horizontal(classes="modal-buttons"):
@@ -55,9 +59,10 @@ class AddModal(ModalScreen):
             diff = self.query_one("#difficulty", Select).value
             topic = self.query_one("#topic", Select).value
             url = self.query_one("#url", Input).value
+            schedule = self.query_one("#schedule", Select).value
 
             if title and diff != Select.BLANK and topic != Select.BLANK:
-                database.add_problem(title, diff, topic, url)
+                database.add_problem(title, diff, topic, url, schedule)
                 self.dismiss(True)
             else:
                 self.notify("Please fill all fields!", severity="error")
@@ -73,9 +78,11 @@ class TimerModal(ModalScreen):
     elapsed_seconds = reactive(0)
     phase = reactive("countdown")
 
-    def __init__(self, problem_title: str):
+    def __init__(self, problem: dict, source: str = "normal"):
         super().__init__()
-        self.problem_title = problem_title
+        self.source = source
+        self.problem_id = problem["id"]
+        self.problem_title = problem["title"]
 
     def compose(self) -> ComposeResult:
         with Container(id="timer-dialog"):
@@ -117,8 +124,8 @@ class TimerModal(ModalScreen):
         if event.button.id == "stop_btn":
             if self.phase == "timer":
                 self.timer.stop()
-                is_new_best, time_val = database.update_best_time(
-                    self.problem_title, self.elapsed_seconds
+                is_new_best, time_val = database.record_attempt(
+                    self.problem_id, self.elapsed_seconds, self.source
                 )
                 self.dismiss(("stopped", self.elapsed_seconds, is_new_best))
         elif event.button.id == "cancel_btn":
@@ -154,6 +161,12 @@ class HelpModal(ModalScreen):
                 with Horizontal(classes="help-row"):
                     yield Static("x", classes="help-key")
                     yield Static("Reset progress", classes="help-desc")
+                with Horizontal(classes="help-row"):
+                    yield Static("u / U", classes="help-key")
+                    yield Static("Undo / redo last change", classes="help-desc")
+                with Horizontal(classes="help-row"):
+                    yield Static("d", classes="help-key")
+                    yield Static("Switch / create deck", classes="help-desc")
                 with Horizontal(classes="help-row"):
                     yield Static("l", classes="help-key")
                     yield Static("Toggle Due / All view", classes="help-desc")
@@ -163,9 +176,21 @@ class HelpModal(ModalScreen):
                 with Horizontal(classes="help-row"):
                     yield Static("ctrl+f", classes="help-key")
                     yield Static("Focus search box", classes="help-desc")
+                with Horizontal(classes="help-row"):
+                    yield Static("topic:dp d:m", classes="help-key")
+                    yield Static(
+                        "Filter in search (also status: stage: url: due:)",
+                        classes="help-desc",
+                    )
                 with Horizontal(classes="help-row"):
                     yield Static("s", classes="help-key")
                     yield Static("Toggle stats panel", classes="help-desc")
+                with Horizontal(classes="help-row"):
+                    yield Static("S / header", classes="help-key")
+                    yield Static("Cycle sort / sort by column", classes="help-desc")
+                with Horizontal(classes="help-row"):
+                    yield Static("ctrl+home/end", classes="help-key")
+                    yield Static("Jump to top / bottom of list", classes="help-desc")
                 with Horizontal(classes="help-row"):
                     yield Static("q", classes="help-key")
                     yield Static("Quit", classes="help-desc")
@@ -175,6 +200,97 @@ class HelpModal(ModalScreen):
         self.dismiss(True)
 
 
+class TestSetupModal(ModalScreen):
+    BINDINGS = [("escape", "cancel", "Cancel")]
+
+    def compose(self) -> ComposeResult:
+        with Container(id="modal-dialog"):
+            yield Label("Test size and filters:")
+            yield Input(
+                value=database.get_test_spec(),
+                placeholder="e.g. 5 Medium DP/Graphs  (add 'weak' for weak spots)",
+                id="test_spec",
+            )
+            with Horizontal(classes="modal-buttons"):
+                yield Button("Start", variant="primary", id="start_btn")
+                yield Button("Cancel", variant="error", id="cancel_btn")
+
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+    def _submit(self) -> None:
+        text = self.query_one("#test_spec", Input).value.strip()
+        spec, error = sampling.parse_spec(text)
+        if error:
+            self.notify(error, severity="error")
+            return
+        database.set_test_spec(text)
+        self.dismiss(spec)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self._submit()
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "start_btn":
+            self._submit()
+        elif event.button.id == "cancel_btn":
+            self.dismiss(None)
+
+
+class DeckModal(ModalScreen):
+    BINDINGS = [("escape", "cancel", "Cancel")]
+
+    def __init__(self, decks: list):
+        super().__init__()
+        self.decks = decks
+
+    def compose(self) -> ComposeResult:
+        due = sum(deck["due"] for deck in self.decks)
+        with Container(id="modal-dialog"):
+            yield Label(f"Decks ({due} due everywhere)")
+            yield DataTable(id="deck_table", cursor_type="row")
+            yield Label("Switch to or create deck:")
+            yield Input(placeholder="Deck name", id="deck_name")
+            with Horizontal(classes="modal-buttons"):
+                yield Button("Switch", variant="primary", id="switch_btn")
+                yield Button("Cancel", variant="error", id="cancel_btn")
+
+    def on_mount(self) -> None:
+        table = self.query_one("#deck_table", DataTable)
+        table.add_columns("Deck", "Problems", "Due")
+        for deck in self.decks:
+            marker = "● " if deck["active"] else "  "
+            table.add_row(
+                marker + deck["deck"],
+                str(deck["total"]),
+                str(deck["due"]),
+                key=deck["deck"],
+            )
+        table.focus()
+
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+    def _submit(self) -> None:
+        name = self.query_one("#deck_name", Input).value.strip()
+        if not name:
+            table = self.query_one("#deck_table", DataTable)
+            name = self.decks[table.cursor_row]["deck"]
+        self.dismiss(name)
+
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        self.dismiss(event.row_key.value)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self._submit()
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "switch_btn":
+            self._submit()
+        elif event.button.id == "cancel_btn":
+            self.dismiss(None)
+
+
 class TestModeScreen(Screen):
     BINDINGS = [
         ("o", "open_problem", "Open & Time"),
@@ -188,16 +304,25 @@ class TestModeScreen(Screen):
     problem_times = reactive({})
     total_time = reactive(0)
 
+    def __init__(self, problems: list, label: str = ""):
+        super().__init__()
+        self._drawn = problems
+        self.label = label
+
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
         with Vertical(id="test-mode-container"):
-            yield Static("TEST MODE", id="test-mode-title")
-            yield Static("Total: 00:00  |  Solved: 0/3", id="test-mode-header")
+            title = f"TEST MODE  ·  {self.label}" if self.label else "TEST MODE"
+            yield Static(title, id="test-mode-title")
+            yield Static(
+                f"Total: 00:00  |  Solved: 0/{len(self._drawn)}",
+                id="test-mode-header",
+            )
             yield DataTable(id="test_mode_table")
         yield Footer()
 
     def on_mount(self) -> None:
-        self.problems = database.get_random_problems(3)
+        self.problems = self._drawn
         self.problem_states = {i: "encrypted" for i in range(len(self.problems))}
         self.problem_times = {}
         self.total_time = 0
@@ -227,7 +352,10 @@ class TestModeScreen(Screen):
 
         solved = len(self.problem_times)
         total_mins, total_secs = divmod(self.total_time, 60)
-        header = f"Total: {total_mins:02d}:{total_secs:02d}  |  Solved: {solved}/3"
+        header = (
+            f"Total: {total_mins:02d}:{total_secs:02d}  |  "
+            f"Solved: {solved}/{len(self.problems)}"
+        )
         self.query_one("#test-mode-header", Static).update(header)
 
     def action_open_problem(self) -> None:
@@ -241,7 +369,6 @@ class TestModeScreen(Screen):
             return
 
         problem = self.problems[idx]
-        title = problem["title"]
 
         def handle_timer_result(result):
             if result and result[0] == "stopped":
@@ -251,7 +378,7 @@ class TestModeScreen(Screen):
                 self.total_time = sum(self.problem_times.values())
                 self._refresh_table()
 
-                if len(self.problem_times) == 3:
+                if len(self.problem_times) == len(self.problems):
                     mins, secs = divmod(self.total_time, 60)
                     self.notify(
                         f"Test Complete! Total: {mins:02d}:{secs:02d}",
@@ -263,7 +390,7 @@ class TestModeScreen(Screen):
 
             webbrowser.open(problem["url"])
 
-        self.push_screen(TimerModal(title), handle_timer_result)
+        self.push_screen(TimerModal(problem, "test"), handle_timer_result)
 
     def action_exit_test_mode(self) -> None:
         self.app.pop_screen()
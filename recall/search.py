@@ -0,0 +1,124 @@
+import sys
+import threading
+from array import array
+
+
+def normalize(text):
+    return " ".join((text or "").casefold().split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def inner_trigrams(text):
+    # Every title containing `text` contains all of these.
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def is_subsequence(needle, haystack):
+    it = iter(haystack)
+    return all(ch in it for ch in needle)
+
+
+class SearchIndex:
+    # Posting lists are packed arrays of ids rather than sets, which keeps
+    # the index a fraction of the deck's size. Searches run in a worker
+    # while the UI thread adds and removes problems, so both sides take
+    # the lock; scoring happens outside it on immutable key tuples.
+    def __init__(self, problems=()):
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._trigrams = {}
+        self._topics = {}
+        for p in problems:
+            self._add(p)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _add(self, p):
+        title = normalize(p.title)
+        topic = sys.intern(normalize(p.topic))
+        self._keys[p.id] = (title, topic)
+        for gram in trigrams(title):
+            self._trigrams.setdefault(gram, array("I")).append(p.id)
+        self._topics.setdefault(topic, array("I")).append(p.id)
+
+    def add(self, p):
+        with self._lock:
+            self._add(p)
+
+    def remove(self, problem_id):
+        with self._lock:
+            keys = self._keys.pop(problem_id, None)
+            if keys is None:
+                return
+            for gram in trigrams(keys[0]):
+                self._trigrams[gram].remove(problem_id)
+            self._topics[keys[1]].remove(problem_id)
+
+    def _candidates(self, query):
+        # The caller holds the lock.
+        if len(query) < 3:
+            return set(self._keys)
+        grams = trigrams(query)
+        hits = {}
+        for gram in grams:
+            for problem_id in self._trigrams.get(gram, ()):
+                hits[problem_id] = hits.get(problem_id, 0) + 1
+        needed = max(1, len(grams) // 2)
+        candidates = {problem_id for problem_id, n in hits.items() if n >= needed}
+        # Plain substrings, e.g. "ach" in "lru cache", miss the threshold
+        # because their padded edge grams do not occur mid-word.
+        postings = sorted(
+            (self._trigrams.get(gram, ()) for gram in inner_trigrams(query)), key=len
+        )
+        if postings and postings[0]:
+            exact = set(postings[0])
+            for ids in postings[1:]:
+                exact.intersection_update(ids)
+            candidates |= exact
+        return candidates
+
+    def score(self, query, problem_id, tokens=None):
+        keys = self._keys.get(problem_id)
+        if keys is None:
+            return 0
+        title, topic = keys
+        if title == query:
+            return 100
+        if title.startswith(query):
+            return 90
+        if query in title:
+            return 80
+        tokens = tokens if tokens is not None else query.split()
+        words = title.split()
+        if all(any(word.startswith(t) for word in words) for t in tokens):
+            return 70
+        if query in topic:
+            return 60
+        if is_subsequence(query.replace(" ", ""), title):
+            return 40
+        return 0
+
+    def search(self, query, is_cancelled=None):
+        query = normalize(query)
+        if not query:
+            return None
+        tokens = query.split()
+        with self._lock:
+            candidates = self._candidates(query)
+            for topic, ids in self._topics.items():
+                if query in topic:
+                    candidates.update(ids)
+
+        matches = {}
+        for i, problem_id in enumerate(candidates):
+            if is_cancelled is not None and i % 1024 == 0 and is_cancelled():
+                return None
+            score = self.score(query, problem_id, tokens)
+            if score:
+                matches[problem_id] = score
+        return matches
@@ -0,0 +1,486 @@
+import os
+import sqlite3
+
+from .database import (
+    DEFAULT_SCHEDULE,
+    _days_from_now,
+    _today,
+    read_snapshot,
+    upcoming_dates,
+    replay_journal,
+    new_problem_fields,
+    reset_changes,
+    review_changes,
+    sample_from,
+    undo_limit,
+)
+from .indexes import BucketIndex
+from .model import Problem, migrate
+from .oplog import OpLog
+from .search import SearchIndex
+
+COLUMNS = [
+    "id",
+    "title",
+    "difficulty",
+    "topic",
+    "date_solved",
+    "last_reviewed",
+    "review_stage",
+    "next_review",
+    "status",
+    "url",
+    "best_time_seconds",
+    "schedule",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS problems (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    difficulty TEXT,
+    topic TEXT,
+    date_solved TEXT,
+    last_reviewed TEXT,
+    review_stage INTEGER NOT NULL DEFAULT 0,
+    next_review TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Active',
+    url TEXT DEFAULT '',
+    best_time_seconds INTEGER,
+    schedule TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_problems_title ON problems (title);
+CREATE INDEX IF NOT EXISTS idx_problems_status_next_review
+    ON problems (status, next_review);
+"""
+
+
+# Column expression per facet, in indexes.FACETS order.
+FACET_COLUMNS = {
+    "topic": "topic",
+    "difficulty": "difficulty",
+    "status": "status",
+    "stage": "review_stage",
+    "has_url": "(url IS NOT NULL AND url != '')",
+}
+
+
+# ORDER BY terms per database.SORT_KEYS order.
+SORT_COLUMNS = {
+    "date_solved": ["date_solved DESC", "id"],
+    "next_review": ["next_review", "id"],
+    "title": ["title COLLATE NOCASE", "id"],
+    "stage": ["review_stage", "id"],
+    "best_time": ["best_time_seconds IS NULL", "best_time_seconds", "id"],
+}
+
+
+def _order_by(order, reverse=False):
+    terms = SORT_COLUMNS[order]
+    if reverse:
+        terms = [
+            term.removesuffix(" DESC") if term.endswith(" DESC") else f"{term} DESC"
+            for term in terms
+        ]
+    return ", ".join(terms)
+
+
+def _facet_where(filters, skip=None):
+    clauses, params = [], []
+    for facet, column in FACET_COLUMNS.items():
+        wanted = filters.get(facet)
+        if wanted is None or facet == skip:
+            continue
+        if facet == "stage":
+            clauses.append(f"{column} BETWEEN ? AND ?")
+            params.extend(wanted)
+        elif facet == "has_url":
+            clauses.append(f"{column} = ?")
+            params.append(int(wanted))
+        else:
+            clauses.append(f"{column} IN ({', '.join('?' for _ in wanted)})")
+            params.extend(wanted)
+    if filters.get("due_within") is not None:
+        clauses.append("status = 'Active' AND next_review <= ?")
+        params.append(_days_from_now(filters["due_within"]))
+    return " AND ".join(clauses), params
+
+
+def _row_to_problem(row):
+    return Problem.from_dict(dict(zip(COLUMNS, row)))
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode this keeps commits durable against crashes of the app
+    # without an fsync on every review.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(problems)")}
+    if "schedule" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE problems ADD COLUMN schedule TEXT")
+    return conn
+
+
+def insert_rows(conn, data):
+    # Hand-edited files may repeat an id or lack one. As in the JSON
+    # backend's _reindex, such a record is given a fresh id (AUTOINCREMENT,
+    # after every kept one) instead of being dropped.
+    kept, fresh, seen = [], [], set()
+    for p in migrate(data, 0):
+        if isinstance(p.get("id"), int) and p["id"] not in seen:
+            seen.add(p["id"])
+            kept.append(p)
+        else:
+            fresh.append({**p, "id": None})
+    rows = [tuple(p[col] for col in COLUMNS) for p in kept + fresh]
+    cur = conn.executemany(
+        f"INSERT OR IGNORE INTO problems ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+        rows,
+    )
+    return cur.rowcount
+
+
+def migrate_from_json(json_path, sqlite_path):
+    data, header = [], {}
+    if os.path.exists(json_path):
+        data, header = read_snapshot(json_path)
+    data, next_id = replay_journal(data, os.path.splitext(json_path)[0] + ".journal")
+    if not data:
+        return 0
+
+    conn = connect(sqlite_path)
+    with conn:
+        count = insert_rows(conn, data)
+        # Ids of problems removed before the move stay used up.
+        conn.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'problems'",
+            (max(header.get("next_id") or 1, next_id) - 1,),
+        )
+    conn.close()
+    return count
+
+
+class SQLiteRepository:
+    def __init__(self, path, json_path=None):
+        self.path = path
+        if json_path is None:
+            json_path = os.path.splitext(path)[0] + ".json"
+        is_new = not os.path.exists(path)
+        if is_new:
+            migrate_from_json(json_path, path)
+        self.conn = connect(path)
+        self._search_index = None
+        self._buckets = None
+        self._data_version = self._read_data_version()
+        self.oplog = OpLog(undo_limit())
+
+    def close(self):
+        self.conn.close()
+
+    def _read_data_version(self):
+        # Changes whenever another connection commits to the database.
+        (version,) = self.conn.execute("PRAGMA data_version").fetchone()
+        return version
+
+    def poll_changes(self):
+        version = self._read_data_version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        self._search_index = None
+        self._buckets = None
+        return True
+
+    def _select(self, where="", params=(), order=""):
+        sql = f"SELECT {', '.join(COLUMNS)} FROM problems"
+        if where:
+            sql += f" WHERE {where}"
+        if order:
+            sql += f" ORDER BY {order}"
+        return [_row_to_problem(r) for r in self.conn.execute(sql, params)]
+
+    def _update(self, problem_id, changes):
+        assignments = ", ".join(f"{col} = ?" for col in changes)
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE problems SET {assignments} WHERE id = ?",
+                (*changes.values(), problem_id),
+            )
+
+    def get_problem(self, problem_id):
+        rows = self._select("id = ?", (problem_id,))
+        return rows[0] if rows else None
+
+    def find_problem(self, title):
+        rows = self._select("title = ?", (title,))
+        return rows[0] if rows else None
+
+    def problems(self):
+        return self._select()
+
+    def iter_problems(self):
+        cur = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM problems")
+        for row in cur:
+            yield _row_to_problem(row)
+
+    def replace_all(self, data):
+        with self.conn:
+            self.conn.execute("DELETE FROM problems")
+            insert_rows(self.conn, [dict(p) for p in data])
+        self._search_index = None
+        self._buckets = None
+
+    def search_index(self):
+        if self._search_index is None:
+            self._search_index = SearchIndex(self._select())
+        return self._search_index
+
+    def add_problem(self, title, difficulty, topic, url="", schedule=DEFAULT_SCHEDULE):
+        fields = new_problem_fields(title, difficulty, topic, url, schedule)
+        try:
+            with self.conn:
+                cur = self.conn.execute(
+                    f"INSERT INTO problems ({', '.join(fields)}) "
+                    f"VALUES ({', '.join('?' for _ in fields)})",
+                    tuple(fields.values()),
+                )
+        except sqlite3.IntegrityError:
+            return False
+        record = Problem.from_dict({"id": cur.lastrowid, **fields})
+        self._track(record)
+        self.oplog.record("add", record.id, title, None, record.to_dict())
+        return True
+
+    def _track(self, record):
+        if self._search_index is not None:
+            self._search_index.add(record)
+        if self._buckets is not None:
+            self._buckets.update(record)
+
+    def add_problems(self, records):
+        added = []
+        with self.conn:
+            for fields in records:
+                cur = self.conn.execute(
+                    f"INSERT OR IGNORE INTO problems ({', '.join(fields)}) "
+                    f"VALUES ({', '.join('?' for _ in fields)})",
+                    tuple(fields.values()),
+                )
+                if cur.rowcount:
+                    added.append(Problem.from_dict({"id": cur.lastrowid, **fields}))
+        if self._search_index is not None:
+            for record in added:
+                self._search_index.add(record)
+        if self._buckets is not None:
+            for record in added:
+                self._buckets.update(record)
+        return added
+
+    def get_due_problems(self):
+        return self._select(
+            "status = 'Active' AND next_review <= ?", (_today(),), "next_review"
+        )
+
+    def get_forecast(self, days):
+        dates = upcoming_dates(days)
+        if not dates:
+            return []
+        counts = dict(
+            self.conn.execute(
+                "SELECT next_review, COUNT(*) FROM problems "
+                "WHERE status = 'Active' AND next_review BETWEEN ? AND ? "
+                "GROUP BY next_review",
+                (dates[0], dates[-1]),
+            ).fetchall()
+        )
+        return [(date, counts.get(date, 0)) for date in dates]
+
+    def get_all_problems(self, order="date_solved", reverse=False):
+        return self._select(order=_order_by(order, reverse))
+
+    def warm_sort_orders(self):
+        # Sorting is left to SQLite.
+        pass
+
+    def filter_problems(self, filters, order="date_solved", reverse=False):
+        where, params = _facet_where(filters)
+        return self._select(where, params, _order_by(order, reverse))
+
+    def facet_counts(self, filters):
+        counts = {}
+        for facet, column in FACET_COLUMNS.items():
+            where, params = _facet_where(filters, skip=facet)
+            sql = f"SELECT {column}, COUNT(*) FROM problems"
+            if where:
+                sql += f" WHERE {where}"
+            rows = self.conn.execute(f"{sql} GROUP BY 1", params)
+            if facet == "has_url":
+                counts[facet] = {bool(value): count for value, count in rows}
+            else:
+                counts[facet] = dict(rows)
+        return counts
+
+    def sample_problems(self, n, topics=None, difficulties=None, weakness=False):
+        if self._buckets is None:
+            self._buckets = BucketIndex(self.iter_problems())
+        return sample_from(
+            self._buckets, self.get_problem, n, topics, difficulties, weakness
+        )
+
+    def get_stats(self):
+        (due,) = self.conn.execute(
+            "SELECT COUNT(*) FROM problems WHERE status = 'Active' AND next_review <= ?",
+            (_today(),),
+        ).fetchone()
+        by_topic = {}
+        for topic, total, mastered, best_avg in self.conn.execute(
+            "SELECT topic, COUNT(*), SUM(status = 'Mastered'), "
+            "ROUND(AVG(best_time_seconds)) FROM problems GROUP BY topic"
+        ):
+            by_topic[topic] = {
+                "total": total,
+                "mastered": mastered,
+                "best_avg": int(best_avg) if best_avg is not None else None,
+            }
+        times = [
+            t
+            for (t,) in self.conn.execute(
+                "SELECT best_time_seconds FROM problems "
+                "WHERE best_time_seconds IS NOT NULL ORDER BY best_time_seconds"
+            )
+        ]
+        return {
+            "total": sum(t["total"] for t in by_topic.values()),
+            "mastered": sum(t["mastered"] for t in by_topic.values()),
+            "by_topic": by_topic,
+            "by_difficulty": dict(
+                self.conn.execute(
+                    "SELECT difficulty, COUNT(*) FROM problems GROUP BY difficulty"
+                )
+            ),
+            "by_stage": dict(
+                self.conn.execute(
+                    "SELECT review_stage, COUNT(*) FROM problems "
+                    "GROUP BY review_stage ORDER BY review_stage"
+                )
+            ),
+            "best_time": {
+                "count": len(times),
+                "fastest": times[0] if times else None,
+                "median": times[len(times) // 2] if times else None,
+            },
+            "due": due,
+        }
+
+    def deck_summary(self):
+        total, mastered = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(status = 'Mastered'), 0) FROM problems"
+        ).fetchone()
+        due = self.conn.execute(
+            "SELECT next_review, COUNT(*) FROM problems WHERE status = 'Active' "
+            "GROUP BY next_review ORDER BY next_review"
+        )
+        return {"total": total, "mastered": mastered, "due": dict(due)}
+
+    def _load_on(self, days):
+        # One lookup on the (status, next_review) index per candidate day.
+        (count,) = self.conn.execute(
+            "SELECT COUNT(*) FROM problems WHERE status = 'Active' AND next_review = ?",
+            (_days_from_now(days),),
+        ).fetchone()
+        return count
+
+    def mark_reviewed(self, problem_id):
+        p = self.get_problem(problem_id)
+        if p is None:
+            return False, "Problem not found."
+        changes, msg = review_changes(p, self._load_on)
+        if changes is None:
+            return False, msg
+        self._update(problem_id, changes)
+        self.oplog.record(
+            "review", problem_id, p.title, {key: p[key] for key in changes}, changes
+        )
+        return True, msg
+
+    def reset_problem(self, problem_id):
+        p = self.get_problem(problem_id)
+        if p is None:
+            return False, "Problem not found."
+        changes = reset_changes(p)
+        self._update(problem_id, changes)
+        self.oplog.record(
+            "reset", problem_id, p.title, {key: p[key] for key in changes}, changes
+        )
+        return True, f"Reset {p['title']} to zero."
+
+    def apply_next_reviews(self, next_reviews):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE problems SET next_review = ? WHERE id = ?",
+                [(date, pid) for pid, date in next_reviews.items()],
+            )
+        return len(next_reviews)
+
+    def update_best_time(self, problem_id, seconds):
+        p = self.get_problem(problem_id)
+        if p is None:
+            return None, None
+        current_best = p["best_time_seconds"]
+        if current_best is None or seconds < current_best:
+            changes = {"best_time_seconds": seconds}
+            self._update(problem_id, changes)
+            self.oplog.record(
+                "best_time",
+                problem_id,
+                p.title,
+                {"best_time_seconds": current_best},
+                changes,
+            )
+            return True, seconds
+        return False, current_best
+
+    def _swap(self, problem_id, expected, target, op_name):
+        # See ProblemRepository._swap. The write lock is taken before the
+        # check so another connection cannot slip in between.
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            p = self.get_problem(problem_id)
+            if expected is None:
+                if p is not None:
+                    return False
+                try:
+                    self.conn.execute(
+                        f"INSERT INTO problems ({', '.join(target)}) "
+                        f"VALUES ({', '.join('?' for _ in target)})",
+                        tuple(target.values()),
+                    )
+                except sqlite3.IntegrityError:
+                    return False
+                self._track(Problem.from_dict(target))
+                return True
+            if p is None or any(p[key] != value for key, value in expected.items()):
+                return False
+            if target is None:
+                self.conn.execute("DELETE FROM problems WHERE id = ?", (problem_id,))
+                if self._search_index is not None:
+                    self._search_index.remove(problem_id)
+                if self._buckets is not None:
+                    self._buckets.discard(problem_id)
+            else:
+                assignments = ", ".join(f"{col} = ?" for col in target)
+                self.conn.execute(
+                    f"UPDATE problems SET {assignments} WHERE id = ?",
+                    (*target.values(), problem_id),
+                )
+        return True
+
+    def undo(self):
+        return self.oplog.undo(self._swap)
+
+    def redo(self):
+        return self.oplog.redo(self._swap)
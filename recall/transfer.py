@@ -0,0 +1,159 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from . import constants
+from . import database
+
+BATCH_SIZE = 1000
+
+FIELDS = [
+    "id",
+    "title",
+    "difficulty",
+    "topic",
+    "date_solved",
+    "last_reviewed",
+    "review_stage",
+    "next_review",
+    "status",
+    "url",
+    "best_time_seconds",
+    "schedule",
+]
+
+_DIFFICULTIES = {value.casefold(): value for _, value in constants.DIFFICULTY_OPTIONS}
+_TOPICS = {value.casefold(): value for _, value in constants.TOPIC_OPTIONS}
+_TOPICS.update(
+    {short.casefold(): topic for topic, short in constants.SHORT_TOPICS.items()}
+)
+_STATUSES = {"active": "Active", "mastered": "Mastered"}
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise ValueError(f"Unknown file format for {path!r}; use .csv or .ndjson")
+
+
+def read_rows(path, fmt=None):
+    fmt = fmt or detect_format(path)
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        # Reported by validate_row like any other bad row.
+                        yield ValueError(f"invalid JSON: {e.msg}")
+
+
+def _text(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def validate_row(row):
+    if isinstance(row, Exception):
+        return None, str(row)
+    if not isinstance(row, dict):
+        return None, "expected an object"
+
+    title = _text(row, "title")
+    if not title:
+        return None, "missing title"
+
+    difficulty = _DIFFICULTIES.get(_text(row, "difficulty").casefold())
+    if difficulty is None:
+        return None, f"unknown difficulty {row.get('difficulty')!r}"
+
+    raw_topic = _text(row, "topic") or _text(row, "topics")
+    topic = _TOPICS.get(raw_topic.casefold())
+    if topic is None:
+        return None, f"unknown topic {raw_topic!r}"
+
+    schedule = _text(row, "schedule") or database.DEFAULT_SCHEDULE
+    schedules = database.get_schedules()
+    if schedule not in schedules:
+        return None, f"unknown schedule {schedule!r}"
+
+    fields = database.new_problem_fields(
+        title, difficulty, topic, _text(row, "url"), schedule
+    )
+    try:
+        for key in ("date_solved", "last_reviewed", "next_review"):
+            if row.get(key):
+                database.parse_date(row[key])
+                fields[key] = row[key]
+        if row.get("review_stage") not in (None, ""):
+            stage = int(row["review_stage"])
+            if not 0 <= stage < len(schedules[schedule]):
+                return None, f"review_stage out of range: {stage}"
+            fields["review_stage"] = stage
+        if row.get("best_time_seconds") not in (None, ""):
+            fields["best_time_seconds"] = int(row["best_time_seconds"])
+    except (ValueError, TypeError) as e:
+        return None, str(e)
+    if _text(row, "status"):
+        status = _STATUSES.get(_text(row, "status").casefold())
+        if status is None:
+            return None, f"unknown status {row['status']!r}"
+        fields["status"] = status
+        if status == "Mastered":
+            # As mark_reviewed leaves a mastered problem.
+            fields["next_review"] = "9999-12-31"
+    return fields, None
+
+
+def import_rows(rows, batch_size=BATCH_SIZE):
+    rows = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        records, invalid, seen = [], [], set()
+        for line_no, row in batch:
+            fields, error = validate_row(row)
+            if error:
+                invalid.append((line_no, error))
+            elif fields["title"] not in seen:
+                seen.add(fields["title"])
+                records.append(fields)
+
+        added = database.add_problems(records)
+        yield {
+            "read": batch[-1][0],
+            "added": len(added),
+            "duplicates": len(batch) - len(invalid) - len(added),
+            "invalid": invalid,
+        }
+
+
+def import_file(path, fmt=None, batch_size=BATCH_SIZE):
+    return import_rows(read_rows(path, fmt), batch_size)
+
+
+def export_file(path, fmt=None):
+    fmt = fmt or detect_format(path)
+    problems = database.iter_problems()
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for p in problems:
+                writer.writerow(p)
+                count += 1
+        else:
+            for p in problems:
+                f.write(json.dumps({key: p.get(key) for key in FIELDS}) + "\n")
+                count += 1
+    return count
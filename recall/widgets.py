@@ -0,0 +1,15 @@
+from textual.binding import Binding
+from textual.widgets import DataTable, Input
+
+
+class SearchInput(Input):
+    BINDINGS = [("ctrl+f", "app.focus_search", "Focus Table")]
+
+
+class ProblemTable(DataTable):
+    # Holds only a window of the list (see RecallApp._sync_view), so the
+    # jumps to either end go through the app, which moves the window.
+    BINDINGS = [
+        Binding("ctrl+home", "app.table_top", "Top", show=False),
+        Binding("ctrl+end", "app.table_bottom", "Bottom", show=False),
+    ]
@@ -0,0 +1,54 @@
+import atexit
+import threading
+import time
+
+from . import profiling
+
+WRITE_DELAY_SECONDS = 0.25
+
+
+class WriteBehind:
+    def __init__(self, delay=WRITE_DELAY_SECONDS):
+        self.delay = delay
+        self.on_error = None
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._drain_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, key, job):
+        # Jobs sharing a key coalesce: only the latest one runs.
+        with self._cond:
+            self._jobs[key] = job
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="recall-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+            time.sleep(self.delay)
+            self._drain()
+
+    def _drain(self):
+        with self._drain_lock:
+            with self._cond:
+                jobs, self._jobs = self._jobs, {}
+            for job in jobs.values():
+                try:
+                    with profiling.span("db.write_behind"):
+                        job()
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(e)
+                    else:
+                        raise
+
+    def flush(self):
+        self._drain()